@@ -3,17 +3,32 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
 from aiogram.enums import ParseMode
-import asyncio
+import html
 import logging
 
+from broadcast import create_broadcast
+from export import FORMATS
+from cache import MISSING, admin_cache, cache_stats
+from mutes import mute_registry
+from outbound import LaneMiddleware
+from stats import fetch_summary
+from user_browser import (
+    FILTERS, cached_search, count_users, encode_cursor, fetch_page, normalize_query, search_key, search_users,
+    valid_cursor
+)
+from keyboards import ADMIN_MENU, USERS_MENU, EXPORT_MENU, BACK_TO_PANEL, BACK_TO_RECENT_USERS
+
 # Configure logging for debugging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 admin_router = Router()
+# Admin javoblari anonim xabarlardan keyin, broadcastdan oldin
+admin_router.message.middleware(LaneMiddleware("admin"))
+admin_router.callback_query.middleware(LaneMiddleware("admin"))
 
 class MuteState(StatesGroup):
     waiting_for_user_id = State()
@@ -27,10 +42,16 @@ class BroadcastState(StatesGroup):
 class SearchUserState(StatesGroup):
     waiting_for_user_id = State()
 
+class ExportState(StatesGroup):
+    waiting_for_range = State()
+
 async def is_user_admin(pool, user_id: int) -> bool:
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT is_admin FROM users WHERE user_id = $1", user_id)
-        return bool(row and row['is_admin'])
+    is_admin = admin_cache.get(user_id)
+    if is_admin is MISSING:
+        row = await pool.row("is_admin", user_id)
+        is_admin = bool(row and row['is_admin'])
+        admin_cache.set(user_id, is_admin)
+    return is_admin
 
 @admin_router.message(Command("admin"))
 async def admin_panel_entry(message: Message, bot: Bot, dispatcher):
@@ -40,76 +61,66 @@ async def admin_panel_entry(message: Message, bot: Bot, dispatcher):
     if not await is_user_admin(pool, user_id):
         return
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📢 Broadcast", callback_data="admin:broadcast")],
-        [InlineKeyboardButton(text="📊 Statistika", callback_data="admin:stats")],
-        [InlineKeyboardButton(text="👥 Foydalanuvchilar", callback_data="admin:users")],
-    ])
-
     await message.answer(
         "<b>👨‍💻 Admin panelga xush kelibsiz!</b>\nQuyidagilardan birini tanlang:",
-        reply_markup=keyboard
+        reply_markup=ADMIN_MENU
     )
 
 @admin_router.callback_query(F.data == "admin:stats")
 async def show_statistics(callback: CallbackQuery, bot: Bot, dispatcher):
     pool = dispatcher['db']
 
-    tashkent_now = datetime.now(ZoneInfo("Asia/Tashkent"))
-    today_start = tashkent_now.replace(hour=0, minute=0, second=0, microsecond=0).replace(tzinfo=None)
-    month_start = tashkent_now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).replace(tzinfo=None)
+    today = datetime.now(ZoneInfo("Asia/Tashkent")).date()
+    summary = await fetch_summary(pool, today)
 
-    async with pool.acquire() as conn:
-        total_users = await conn.fetchval("SELECT COUNT(*) FROM users")
-        today_users = await conn.fetchval(
-            "SELECT COUNT(*) FROM users WHERE created_at >= $1", today_start
-        )
-        month_users = await conn.fetchval(
-            "SELECT COUNT(*) FROM users WHERE created_at >= $1", month_start
-        )
+    def triple(column):
+        return f"{summary['today_' + column]} / {summary['month_' + column]} / {summary['total_' + column]}"
 
     text = (
         "<b>📊 Statistika</b>\n\n"
-        f"👥 Umumiy foydalanuvchilar: <b>{total_users}</b>\n"
-        f"📅 Oylik qo‘shilganlar: <b>{month_users}</b>\n"
-        f"📆 Kunlik qo‘shilganlar: <b>{today_users}</b>"
+        f"👥 Umumiy foydalanuvchilar: <b>{summary['total_new_users']}</b>\n"
+        f"📅 Oylik qo‘shilganlar: <b>{summary['month_new_users']}</b>\n"
+        f"📆 Kunlik qo‘shilganlar: <b>{summary['today_new_users']}</b>\n\n"
+        "<i>bugun / oy / jami</i>\n"
+        f"✉️ Xabarlar: <b>{triple('messages')}</b>\n"
+        f"🗣 Faol yuboruvchilar: <b>{summary['today_active_senders']} / "
+        f"{summary['month_new_month_senders']} / {summary['total_new_senders']}</b>\n"
+        f"💬 Matn: {triple('text_messages')}\n"
+        f"🖼 Rasm: {triple('photo_messages')}\n"
+        f"🎥 Video: {triple('video_messages')}\n"
+        f"🎤 Ovozli: {triple('voice_messages')}\n"
+        f"📎 Fayl: {triple('document_messages')}\n"
+        f"➕ Boshqa: {triple('other_messages')}\n\n"
+        "<b>🧠 Kesh:</b>\n"
+    )
+    for stats in cache_stats():
+        text += f"• {stats['name']}: {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}), {stats['size']} ta\n"
+
+    log_stats = dispatcher["message_log"].stats()
+    text += (
+        f"\n<b>📝 Xabar logi:</b> navbatda {log_stats['depth']}, yozildi {log_stats['flushed']}, "
+        f"flush {log_stats['last_flush_latency'] * 1000:.0f} ms"
     )
 
     await callback.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Orqaga", callback_data="admin:back_to_panel")]
-        ])
+        reply_markup=BACK_TO_PANEL
     )
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin:back_to_panel")
 async def back_to_main_menu(callback: CallbackQuery):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📢 Broadcast", callback_data="admin:broadcast")],
-        [InlineKeyboardButton(text="📊 Statistika", callback_data="admin:stats")],
-        [InlineKeyboardButton(text="👥 Foydalanuvchilar", callback_data="admin:users")],
-    ])
-
     await callback.message.edit_text(
         "<b>👨‍💻 Admin panelga xush kelibsiz!</b>\nQuyidagilardan birini tanlang:",
-        reply_markup=keyboard
+        reply_markup=ADMIN_MENU
     )
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin:users")
 async def open_users_menu(callback: CallbackQuery):
-    users_menu = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔍 Foydalanuvchini qidirish", callback_data="admin:search")],
-        [InlineKeyboardButton(text="🆕 So‘nggi 10 user", callback_data="admin:recent_users:1")],
-        [InlineKeyboardButton(text="⛔ Bloklash / Mute", callback_data="admin:punish")],
-        [InlineKeyboardButton(text="🔓 Mute’dan chiqarish", callback_data="admin:unmute")],
-        [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="admin:back_to_panel")],
-    ])
-
     await callback.message.edit_text(
         "<b>👥 Foydalanuvchilar bo‘limi:</b>\nKerakli funksiyani tanlang:",
-        reply_markup=users_menu
+        reply_markup=USERS_MENU
     )
     await callback.answer()
 
@@ -127,56 +138,19 @@ async def process_broadcast(message: Message, state: FSMContext, bot: Bot, dispa
     pool = dispatcher['db']
     await state.clear()
 
-    await message.answer("<i>⏳ Xabar yuborilmoqda...</i>")
-
-    success = 0
-    fail = 0
-    batch_size = 30  # Batch size to avoid hitting Telegram rate limits
-    delay_between_batches = 1.0  # Delay in seconds between batches
+    progress = await message.answer("<i>⏳ Xabar yuborilmoqda...</i>")
 
-    async with pool.acquire() as conn:
-        users = await conn.fetch("SELECT user_id FROM users")
-
-    total_users = len(users)
-    for i in range(0, total_users, batch_size):
-        batch = users[i:i + batch_size]
-        tasks = []
-
-        for user in batch:
-            # Use bot.copy_message to create a coroutine
-            tasks.append(bot.copy_message(
-                chat_id=user['user_id'],
-                from_chat_id=message.chat.id,
-                message_id=message.message_id
-            ))
-
-        # Send messages in parallel for this batch
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for result in results:
-            if isinstance(result, Exception):
-                logger.error(f"Failed to send message to user: {result}")
-                fail += 1
-            else:
-                success += 1
-
-        # Progress update every 100 users
-        if (i + batch_size) % 100 == 0 or i + batch_size >= total_users:
-            await message.answer(
-                f"<i>📬 Yuborilmoqda: {min(i + batch_size, total_users)} / {total_users} foydalanuvchi...</i>",
-                parse_mode=ParseMode.HTML
-            )
-
-        # Delay to respect Telegram rate limits
-        if i + batch_size < total_users:
-            await asyncio.sleep(delay_between_batches)
-
-    await message.answer(
-        f"<b>✅ Broadcast yakunlandi!</b>\n\n"
-        f"📬 Yuborildi: <b>{success}</b>\n"
-        f"❌ Yuborilmadi: <b>{fail}</b>",
-        parse_mode=ParseMode.HTML
+    # The broadcaster streams recipients and reports progress in the
+    # background, so the admin chat is free again right away
+    broadcast_id = await create_broadcast(
+        pool,
+        admin_chat_id=message.chat.id,
+        from_chat_id=message.chat.id,
+        message_id=message.message_id,
+        progress_message_id=progress.message_id
     )
+    dispatcher["broadcaster"].notify()
+    logger.info(f"Broadcast {broadcast_id} queued by {message.from_user.id}")
 
 @admin_router.callback_query(F.data == "admin:punish")
 async def start_mute(callback: CallbackQuery, state: FSMContext):
@@ -199,7 +173,8 @@ async def get_duration(message: Message, state: FSMContext):
     try:
         minutes = int(message.text.strip())
         muted_until = (datetime.now(ZoneInfo("Asia/Tashkent")) + timedelta(minutes=minutes)).replace(tzinfo=None)
-        await state.update_data(muted_until=muted_until)
+        # FSM data is stored as JSON, so the timestamp travels as a string
+        await state.update_data(muted_until=muted_until.isoformat())
         await state.set_state(MuteState.waiting_for_reason)
         await message.answer("📝 Sababni yozing:")
     except ValueError:
@@ -211,17 +186,12 @@ async def finish_mute(message: Message, state: FSMContext, dispatcher):
     await state.clear()
 
     user_id = data['user_id']
-    muted_until = data['muted_until']
+    muted_until = datetime.fromisoformat(data['muted_until'])
     reason = message.text.strip()
 
     pool = dispatcher["db"]
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO muted_users (user_id, muted_until, reason)
-            VALUES ($1, $2, $3)
-            ON CONFLICT (user_id) DO UPDATE
-            SET muted_until = $2, reason = $3, created_at = CURRENT_TIMESTAMP
-        """, user_id, muted_until, reason)
+    await pool.status("mute_user", user_id, muted_until, reason)
+    mute_registry.mute(user_id, muted_until)
 
     await message.answer(
         f"✅ <a href='tg://user?id={user_id}'>Foydalanuvchi</a> {muted_until:%Y-%m-%d %H:%M} gacha mute qilindi.\n"
@@ -237,14 +207,18 @@ async def ask_user_id_for_unmute(callback: CallbackQuery, state: FSMContext):
 
 @admin_router.message(MuteState.waiting_for_unmute_id)
 async def unmute_user(message: Message, state: FSMContext, dispatcher):
-    user_id = message.text.strip()
+    user_id = (message.text or "").strip()
+    if not user_id.isdigit():
+        await message.answer("❌ Noto‘g‘ri ID. Qayta urinib ko‘ring.")
+        return
     await state.clear()
 
-    pool = dispatcher["db"]
-    async with pool.acquire() as conn:
-        result = await conn.execute("DELETE FROM muted_users WHERE user_id = $1", int(user_id))
+    user_id = int(user_id)
+    # Flood mutes still waiting to be written and the strikes go too
+    was_muted = await mute_registry.unmute(user_id)
+    dispatcher["throttling"].forgive(user_id)
 
-    if result == "DELETE 1":
+    if was_muted:
         await message.answer(f"✅ <a href='tg://user?id={user_id}'>Foydalanuvchi</a> mute’dan chiqarildi.",
                              parse_mode="HTML")
     else:
@@ -252,7 +226,7 @@ async def unmute_user(message: Message, state: FSMContext, dispatcher):
 
 @admin_router.callback_query(F.data == "admin:search")
 async def ask_user_id(callback: CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("🔍 Qidirish uchun foydalanuvchi ID sini yuboring:")
+    await callback.message.edit_text("🔍 Qidirish uchun foydalanuvchi ID, @username yoki ismini yuboring:")
     await state.set_state(SearchUserState.waiting_for_user_id)
 
 @admin_router.message(SearchUserState.waiting_for_user_id)
@@ -260,20 +234,26 @@ async def show_user_info(message: Message, state: FSMContext, dispatcher):
     await state.clear()
     pool = dispatcher["db"]
 
-    try:
-        user_id = int(message.text.strip())
-    except ValueError:
-        await message.answer("❌ Noto‘g‘ri ID format. Iltimos, faqat raqam yuboring.")
+    text = (message.text or "").strip()
+    if not text.isdigit():
+        # Not an ID: look the text up by username and name
+        query = normalize_query(text)
+        if not query:
+            await message.answer("❌ Iltimos, ID, @username yoki ism yuboring.")
+            return
+        matches, truncated = await search_users(pool, query)
+        page_text, keyboard = render_search_page(search_key(query), query, matches, truncated, page=1)
+        await message.answer(page_text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
         return
 
+    user_id = int(text)
     async with pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT user_id, username, name, is_admin, created_at FROM users WHERE user_id = $1",
-                                   user_id)
+        user = await conn.row("user_info", user_id)
         if not user:
             await message.answer("😕 Bunday foydalanuvchi topilmadi.")
             return
 
-        muted_row = await conn.fetchrow("SELECT muted_until FROM muted_users WHERE user_id = $1", user_id)
+        muted_row = await conn.row("muted_until", user_id)
 
     is_muted = bool(muted_row)
     muted_until = muted_row["muted_until"] if muted_row else None
@@ -288,23 +268,84 @@ async def show_user_info(message: Message, state: FSMContext, dispatcher):
         parse_mode=ParseMode.HTML
     )
 
+SEARCH_PAGE_SIZE = 10
+
+# 🔎 Qidiruv natijalari sahifasi (natijalar search_cache'dan olinadi)
+def render_search_page(key: str, query: str, matches: list, truncated: bool, page: int):
+    total_pages = max(1, (len(matches) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE)
+    page = min(max(page, 1), total_pages)
+    shown = matches[(page - 1) * SEARCH_PAGE_SIZE:page * SEARCH_PAGE_SIZE]
+
+    text = f"<b>🔍 «{html.escape(query)}» bo‘yicha</b> ({len(matches)}{'+' if truncated else ''} ta)\n"
+    text += f"<i>Sahifa {page} / {total_pages}</i>\n\n"
+    if not shown:
+        text += "😕 Hech kim topilmadi."
+    for user in shown:
+        username = f"@{user['username']}" if user['username'] else "—"
+        text += f"🆔 <code>{user['user_id']}</code> | {html.escape(user['name'] or '')} | {html.escape(username)}\n"
+    if truncated:
+        text += "\n<i>Faqat eng mos natijalar ko‘rsatildi — so‘rovni aniqroq yozing.</i>"
+
+    buttons = []
+    if page > 1:
+        buttons.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"admin:search_page:{key}:{page - 1}"))
+    if page < total_pages:
+        buttons.append(InlineKeyboardButton(text="Keyingi ➡️", callback_data=f"admin:search_page:{key}:{page + 1}"))
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        *[
+            [InlineKeyboardButton(text=f"👤 {user['name']}", callback_data=f"admin:select_user:{user['user_id']}")]
+            for user in shown
+        ],
+        *([buttons] if buttons else []),
+        [InlineKeyboardButton(text="🔍 Yangi qidiruv", callback_data="admin:search")],
+        [InlineKeyboardButton(text="🔙 Orqaga", callback_data="admin:users")]
+    ])
+    return text, keyboard
+
+@admin_router.callback_query(F.data.startswith("admin:search_page:"))
+async def show_search_page(callback: CallbackQuery):
+    _, _, key, page = callback.data.split(":")
+    cached = cached_search(key)
+    if cached is None:
+        await callback.message.edit_text(
+            "⌛ Qidiruv natijalari eskirdi, qaytadan qidiring.",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔍 Yangi qidiruv", callback_data="admin:search")]
+            ])
+        )
+        await callback.answer()
+        return
+
+    query, matches, truncated = cached
+    text, keyboard = render_search_page(key, query, matches, truncated, int(page))
+    await callback.message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+    await callback.answer()
+
 @admin_router.callback_query(F.data.startswith("admin:recent_users:"))
 async def show_recent_users(callback: CallbackQuery, dispatcher):
     pool = dispatcher["db"]
-    page = int(callback.data.split(":")[-1])
     users_per_page = 10
-    offset = (page - 1) * users_per_page
 
-    async with pool.acquire() as conn:
-        total_users = await conn.fetchval("SELECT COUNT(*) FROM users")
-        users = await conn.fetch(
-            "SELECT user_id, name, created_at FROM users ORDER BY created_at DESC LIMIT $1 OFFSET $2",
-            users_per_page, offset
-        )
+    # admin:recent_users:<filter>[:<direction>:<cursor>:<page>]; the old
+    # "admin:recent_users:1" form still opens the first page
+    parts = callback.data.split(":")[2:]
+    code = parts[0] if parts[0] in FILTERS else "a"
+    if len(parts) == 4:
+        direction, cursor, page = parts[1], parts[2], parts[3]
+        if direction not in ("n", "p") or not (page.isascii() and page.isdigit()) or not valid_cursor(cursor):
+            await callback.answer("⚠️ Sahifa topilmadi.", show_alert=True)
+            return
+        page = int(page)
+    else:
+        direction, cursor, page = "n", None, 1
 
-    total_pages = (total_users + users_per_page - 1) // users_per_page
+    users, has_more = await fetch_page(pool, code, direction, cursor, users_per_page)
+    total_users, approximate = await count_users(pool, code)
+    total_pages = max(1, (total_users + users_per_page - 1) // users_per_page)
 
-    text = "<b>🆕 So‘nggi foydalanuvchilar:</b>\n\n"
+    text = f"<b>🆕 So‘nggi foydalanuvchilar</b> ({FILTERS[code]}, {'~' if approximate else ''}{total_users} ta)\n"
+    text += f"<i>Sahifa {page} / {'~' if approximate else ''}{total_pages}</i>\n\n"
     if not users:
         text += "😕 Foydalanuvchilar topilmadi."
     else:
@@ -313,10 +354,24 @@ async def show_recent_users(callback: CallbackQuery, dispatcher):
 
     # Pagination buttons
     buttons = []
-    if page > 1:
-        buttons.append(InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"admin:recent_users:{page - 1}"))
-    if page < total_pages:
-        buttons.append(InlineKeyboardButton(text="Keyingi ➡️", callback_data=f"admin:recent_users:{page + 1}"))
+    if users and page > 1:
+        first = encode_cursor(users[0]['sort_at'], users[0]['user_id'])
+        buttons.append(InlineKeyboardButton(
+            text="⬅️ Oldingi", callback_data=f"admin:recent_users:{code}:p:{first}:{page - 1}"
+        ))
+    if users and (has_more or direction == "p"):
+        last = encode_cursor(users[-1]['sort_at'], users[-1]['user_id'])
+        buttons.append(InlineKeyboardButton(
+            text="Keyingi ➡️", callback_data=f"admin:recent_users:{code}:n:{last}:{page + 1}"
+        ))
+
+    # Filter buttons
+    filter_buttons = [
+        InlineKeyboardButton(
+            text=f"• {label}" if key == code else label, callback_data=f"admin:recent_users:{key}"
+        )
+        for key, label in FILTERS.items()
+    ]
 
     # User selection buttons
     user_buttons = [
@@ -326,7 +381,9 @@ async def show_recent_users(callback: CallbackQuery, dispatcher):
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         *user_buttons,
-        buttons,
+        *([buttons] if buttons else []),
+        filter_buttons[:3],
+        filter_buttons[3:],
         [InlineKeyboardButton(text="🔙 Orqaga", callback_data="admin:users")]
     ])
 
@@ -339,14 +396,13 @@ async def select_user(callback: CallbackQuery, dispatcher):
     user_id = int(callback.data.split(":")[-1])
 
     async with pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT user_id, username, name, is_admin, created_at FROM users WHERE user_id = $1",
-                                   user_id)
+        user = await conn.row("user_info", user_id)
         if not user:
             await callback.message.edit_text("😕 Bunday foydalanuvchi topilmadi.", parse_mode=ParseMode.HTML)
             await callback.answer()
             return
 
-        muted_row = await conn.fetchrow("SELECT muted_until FROM muted_users WHERE user_id = $1", user_id)
+        muted_row = await conn.row("muted_until", user_id)
 
     is_muted = bool(muted_row)
     muted_until = muted_row["muted_until"] if muted_row else None
@@ -360,9 +416,63 @@ async def select_user(callback: CallbackQuery, dispatcher):
         f"🔇 Mute: {'✅ ' + muted_until.strftime('%Y-%m-%d %H:%M') if is_muted else '❌'}"
     )
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Orqaga", callback_data="admin:recent_users:1")]
-    ])
+    await callback.message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=BACK_TO_RECENT_USERS)
+    await callback.answer()
 
-    await callback.message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
-    await callback.answer()
\ No newline at end of file
+# 📤 Eksport: foydalanuvchilar yoki message_log oralig‘i
+EXPORT_BUSY = "⏳ Boshqa eksport hali tugamadi. Birozdan so‘ng urinib ko‘ring."
+
+@admin_router.callback_query(F.data == "admin:export")
+async def open_export_menu(callback: CallbackQuery):
+    await callback.message.edit_text(
+        "<b>📤 Eksport</b>\nFayl gzip qilingan holda shu chatga yuboriladi:",
+        reply_markup=EXPORT_MENU
+    )
+    await callback.answer()
+
+@admin_router.callback_query(F.data.startswith("admin:export:"))
+async def choose_export(callback: CallbackQuery, state: FSMContext, dispatcher):
+    # The whole table leaves the bot here, so the menu alone is not trusted
+    if not await is_user_admin(dispatcher["db"], callback.from_user.id):
+        await callback.answer()
+        return
+
+    # Callback data comes from the client, so a forged one gets an answer too
+    _, _, kind, fmt = (callback.data.split(":") + [""] * 4)[:4]
+    if kind not in ("users", "messages") or fmt not in FORMATS:
+        await callback.answer("⚠️ Noma’lum eksport turi.", show_alert=True)
+        return
+
+    if kind == "messages":
+        await state.set_state(ExportState.waiting_for_range)
+        await state.set_data({"format": fmt})
+        await callback.message.edit_text(
+            "📅 Sana oralig‘ini yuboring: <code>2026-01-01 2026-01-31</code>\n"
+            "Bitta kun uchun bitta sana yetarli."
+        )
+        await callback.answer()
+        return
+
+    started = dispatcher["exporter"].export_users(callback.message.chat.id, callback.message.message_id, fmt)
+    if not started:
+        await callback.answer(EXPORT_BUSY, show_alert=True)
+        return
+    await callback.message.edit_text("<i>⏳ Eksport boshlandi...</i>")
+    await callback.answer()
+
+@admin_router.message(ExportState.waiting_for_range)
+async def export_messages(message: Message, state: FSMContext, dispatcher):
+    try:
+        days = [date.fromisoformat(part) for part in (message.text or "").split()]
+    except ValueError:
+        days = []
+    if len(days) not in (1, 2) or days[0] > days[-1]:
+        await message.answer("❌ Sana noto‘g‘ri. Masalan: <code>2026-01-01 2026-01-31</code>")
+        return
+
+    fmt = (await state.get_data())["format"]
+    await state.clear()
+    progress = await message.answer("<i>⏳ Eksport boshlandi...</i>")
+    started = dispatcher["exporter"].export_messages(message.chat.id, progress.message_id, fmt, days[0], days[-1])
+    if not started:
+        await progress.edit_text(EXPORT_BUSY)
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_ID = 100_000_001
+
+# Methods whose result is a plain True
+BOOLEAN_METHODS = {
+    "deleteWebhook", "setWebhook", "answerCallbackQuery", "deleteMessage", "setMyCommands",
+}
+# Only sends can be rate limited or blocked; getMe and friends always work
+SEND_METHODS = {
+    "sendMessage", "copyMessage", "copyMessages", "sendPhoto", "sendVideo", "sendVoice",
+    "sendDocument", "sendMediaGroup", "forwardMessage",
+}
+
+
+# 🧪 Bot API'ga o‘xshash lokal server: kechikish va 429/403 xatolarini qo‘shish mumkin
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.01, rate_429: float = 0.0,
+                 rate_403: float = 0.0, retry_after: int = 1, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_403 = rate_403
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.sent: dict[int, list[tuple[int, str]]] = {}  # chat_id -> (message_id, text or caption)
+        self._random = random.Random(seed)
+        self._message_ids = iter(range(1, 1 << 62))
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, handle_signals=False)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=host, port=port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # Id of the newest message sent to chat_id whose text or caption has
+    # fragment in it, once one arrives
+    async def wait_for(self, chat_id: int, fragment: str, timeout: float = 10.0) -> int | None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            for message_id, text in reversed(self.sent.get(chat_id, [])):
+                if fragment in text:
+                    return message_id
+            await asyncio.sleep(0.005)
+        return None
+
+    def _record(self, chat_id: int, message_id: int, text: str | None):
+        if text is not None:
+            self.sent.setdefault(chat_id, []).append((message_id, text))
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.latency else 0.0
+        await asyncio.sleep(delay)
+
+        if method in SEND_METHODS:
+            roll = self._random.random()
+            if roll < self.rate_429:
+                self.injected["429"] += 1
+                return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                                   {"retry_after": self.retry_after})
+            if roll < self.rate_429 + self.rate_403:
+                self.injected["403"] += 1
+                return self._error(403, "Forbidden: bot was blocked by the user")
+
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    @staticmethod
+    def _error(code: int, description: str, parameters: dict | None = None) -> web.Response:
+        payload = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            payload["parameters"] = parameters
+        return web.json_response(payload, status=code)
+
+    def _result(self, method: str, params: dict):
+        if method == "getMe":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method in BOOLEAN_METHODS:
+            return True
+        if method == "copyMessage":
+            message_id = next(self._message_ids)
+            self._record(int(params["chat_id"]), message_id, params.get("caption"))
+            return {"message_id": message_id}
+        if method == "copyMessages":
+            return [{"message_id": next(self._message_ids)} for _ in json.loads(params["message_ids"])]
+        if method == "sendMediaGroup":
+            return [self._message(params) for _ in json.loads(params["media"])]
+        return self._message(params)
+
+    def _message(self, params: dict) -> dict:
+        chat_id = int(params.get("chat_id", 0))
+        text = params.get("text")
+        message_id = int(params.get("message_id") or next(self._message_ids))
+        self._record(chat_id, message_id, text)
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"},
+            "text": text or "",
+        }
@@ -0,0 +1,253 @@
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from stats import COUNTER_COLUMNS
+
+
+# 🗃 Xotiradagi soxta baza: db.Database o‘rniga, faqat bench uchun
+class FakeDatabase:
+    # Named queries used on the message, registration and admin paths are
+    # emulated; ad-hoc SQL is matched by a fragment of its text and
+    # anything unknown is a no-op. latency is added to every call and
+    # max_size caps concurrent "connections" the way the real pool does.
+    def __init__(self, latency: float = 0.0005, max_size: int = 10, admins: tuple = ()):
+        self.latency = latency
+        self.users: dict[int, dict] = {}
+        self.tokens: dict[str, int] = {}
+        self.muted: dict[int, datetime] = {}
+        self.broadcasts: dict[int, dict] = {}
+        self.conversations: dict[int, dict] = {}
+        self.conversation_messages: dict[tuple[int, int], int] = {}
+        self.outbox: dict[int, dict] = {}
+        self._outbox_keys: set[str] = set()
+        self.copied_rows = 0
+        self.queries: Counter = Counter()
+        self._admins = set(admins)
+        self._semaphore = asyncio.Semaphore(max_size)
+
+    def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def check(self) -> dict:
+        return {"ok": True}
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float | None = None):
+        async with self._semaphore:
+            yield FakeConnection(self)
+
+    async def row(self, name: str, *args):
+        async with self.acquire() as conn:
+            return await conn.row(name, *args)
+
+    async def rows(self, name: str, *args):
+        async with self.acquire() as conn:
+            return await conn.rows(name, *args)
+
+    async def val(self, name: str, *args):
+        async with self.acquire() as conn:
+            return await conn.val(name, *args)
+
+    async def status(self, name: str, *args) -> str:
+        async with self.acquire() as conn:
+            return await conn.status(name, *args)
+
+    # 📚 Nomlangan so‘rovlar
+    def register_users(self, user_ids, usernames, names, tokens, created_ats):
+        rows = []
+        for user_id, username, name, token, created_at in zip(user_ids, usernames, names, tokens, created_ats):
+            user = self.users.get(user_id)
+            created = user is None
+            if created:
+                user = self.users[user_id] = {
+                    "user_id": user_id, "token": token, "created_at": created_at,
+                    "is_admin": user_id in self._admins,
+                }
+                self.tokens[token] = user_id
+            user.update(username=username, name=name)
+            rows.append({"user_id": user_id, "token": user["token"], "created": created})
+        return rows
+
+    def user_by_token(self, token, now):
+        user_id = self.tokens.get(token)
+        return {"user_id": user_id} if user_id is not None else None
+
+    def is_admin(self, user_id):
+        if user_id in self._admins:
+            return {"is_admin": True}
+        user = self.users.get(user_id)
+        return {"is_admin": user["is_admin"]} if user else None
+
+    def user_info(self, user_id):
+        user = self.users.get(user_id)
+        return {**user, "username": user.get("username")} if user else None
+
+    def muted_until(self, user_id):
+        muted_until = self.muted.get(user_id)
+        return {"muted_until": muted_until} if muted_until else None
+
+    def mute_user(self, user_id, muted_until, reason):
+        self.muted[user_id] = muted_until
+        return "INSERT 0 1"
+
+    def unmute_user(self, user_id):
+        return f"DELETE {int(self.muted.pop(user_id, None) is not None)}"
+
+    def rotate_token(self, user_id, token, expires_at):
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        if self.tokens.get(token, user_id) != user_id:
+            return {"old_token": None, "new_token": None}
+        old_token, user["token"] = user["token"], token
+        self.tokens[token] = user_id
+        return {"old_token": old_token, "new_token": token}
+
+    def expire_token_aliases(self, now):
+        return "DELETE 0"
+
+    def open_conversation(self, sender_id, receiver_id):
+        for conversation in self.conversations.values():
+            if (conversation["sender_id"], conversation["receiver_id"]) == (sender_id, receiver_id):
+                return {"id": conversation["id"]}
+        conversation_id = len(self.conversations) + 1
+        self.conversations[conversation_id] = {
+            "id": conversation_id, "sender_id": sender_id, "receiver_id": receiver_id,
+        }
+        return {"id": conversation_id}
+
+    def conversation(self, conversation_id):
+        return self.conversations.get(conversation_id)
+
+    def conversation_by_message(self, chat_id, message_id):
+        return self.conversations.get(self.conversation_messages.get((chat_id, message_id)))
+
+    def remember_conversation_messages(self, chat_ids, message_ids, conversation_ids, created_at):
+        for key, conversation_id in zip(zip(chat_ids, message_ids), conversation_ids):
+            self.conversation_messages.setdefault(key, conversation_id)
+        return f"INSERT 0 {len(chat_ids)}"
+
+    def expire_conversation_messages(self, cutoff):
+        return "DELETE 0"
+
+    def enqueue_outbox(self, key, sender_id, target_id, conversation_id, parts, now):
+        if key in self._outbox_keys:
+            return None
+        self._outbox_keys.add(key)
+        row_id = len(self.outbox) + 1
+        self.outbox[row_id] = {
+            "id": row_id, "sender_id": sender_id, "target_id": target_id, "conversation_id": conversation_id,
+            "parts": parts, "attempts": 0, "status": "pending", "next_attempt_at": now, "locked_by": None,
+        }
+        return {"id": row_id}
+
+    def claim_outbox(self, worker_id, now, lease, limit):
+        rows = []
+        for row in self.outbox.values():
+            if len(rows) >= limit:
+                break
+            if row["status"] == "pending" and row["next_attempt_at"] <= now:
+                row.update(status="sending", locked_by=worker_id, attempts=row["attempts"] + 1)
+                rows.append(dict(row))
+        return rows
+
+    def finish_outbox(self, ids, statuses, next_attempts, errors, now, worker_id):
+        updated = 0
+        for row_id, status, next_attempt_at in zip(ids, statuses, next_attempts):
+            row = self.outbox[row_id]
+            if row["locked_by"] != worker_id:
+                continue
+            row.update(status=status, locked_by=None, next_attempt_at=next_attempt_at or row["next_attempt_at"])
+            updated += 1
+        return f"UPDATE {updated}"
+
+    def expire_outbox(self, cutoff):
+        return "DELETE 0"
+
+
+class FakeConnection:
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    async def _tick(self, label: str):
+        self.db.queries[label] += 1
+        await asyncio.sleep(self.db.latency)
+
+    # Named queries return what db.Database would: rows, a value or a status
+    async def row(self, name: str, *args):
+        await self._tick(name)
+        return getattr(self.db, name)(*args)
+
+    async def rows(self, name: str, *args):
+        await self._tick(name)
+        return getattr(self.db, name)(*args)
+
+    async def val(self, name: str, *args):
+        row = await self.row(name, *args)
+        return next(iter(row.values())) if row else None
+
+    async def status(self, name: str, *args) -> str:
+        await self._tick(name)
+        result = getattr(self.db, name)(*args)
+        return result if isinstance(result, str) else "SELECT 1"
+
+    # 🔎 Ad-hoc SQL: matni bo‘yicha
+    async def fetch(self, sql: str, *args, timeout=None):
+        await self._tick("fetch")
+        if "AS t(token)" in sql:
+            return [{"token": token} for token in args[0] if token not in self.db.tokens]
+        if "WHERE user_id > $1 AND blocked_at IS NULL" in sql:
+            cursor, limit = args[0], args[1]
+            return [{"user_id": user_id} for user_id in sorted(self.db.users) if user_id > cursor][:limit]
+        if "ORDER BY u.created_at" in sql:
+            users = sorted(self.db.users.values(), key=lambda u: (u["created_at"], u["user_id"]), reverse=True)
+            return [{"user_id": u["user_id"], "name": u.get("name"), "created_at": u["created_at"],
+                     "sort_at": u["created_at"]} for u in users[:args[-1]]]
+        return []
+
+    async def fetchrow(self, sql: str, *args, timeout=None):
+        await self._tick("fetchrow")
+        if "FROM daily_stats" in sql:
+            return {f"{period}_{column}": 0 for period in ("today", "month", "total") for column in COUNTER_COLUMNS}
+        if "SET status = 'running'" in sql:
+            for job in sorted(self.db.broadcasts.values(), key=lambda job: job["id"]):
+                if job["status"] in ("pending", "running"):
+                    job["status"] = "running"
+                    return job
+        return None
+
+    async def fetchval(self, sql: str, *args, timeout=None):
+        await self._tick("fetchval")
+        if "INSERT INTO broadcasts" in sql:
+            job_id = len(self.db.broadcasts) + 1
+            self.db.broadcasts[job_id] = {
+                "id": job_id, "admin_chat_id": args[0], "from_chat_id": args[1], "message_id": args[2],
+                "progress_message_id": args[3], "total": len(self.db.users), "status": "pending",
+                "last_user_id": 0, "sent": 0, "failed": 0,
+            }
+            return job_id
+        if "reltuples" in sql:
+            return len(self.db.users)
+        return None
+
+    async def execute(self, sql: str, *args, timeout=None):
+        await self._tick("execute")
+        if "SET status = 'done'" in sql:
+            self.db.broadcasts[args[0]]["status"] = "done"
+        return "OK"
+
+    async def executemany(self, sql: str, args, timeout=None):
+        await self._tick("executemany")
+
+    async def copy_records_to_table(self, table_name: str, *, records, columns=None, timeout=None):
+        await self._tick("copy")
+        self.db.copied_rows += len(records)
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
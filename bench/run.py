@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from bench.fake_api import FakeBotAPI
+from bench.fake_db import FakeDatabase
+from bench.updates import UpdateFactory
+from outbound import OUTBOUND_WAIT
+
+# 🏋️ Yuklama sinovi: soxta Bot API + soxta (yoki lokal) Postgres
+#
+#   python -m bench.run --scenario all --rps 100 --duration 10
+#   python -m bench.run --scenario broadcast --dsn postgresql://localhost/anonim_bench
+#   python -m bench.run --scenario mixed --outbound-rate 200 --broadcast-users 20000
+#
+# Updates go through dp.feed_update, so middlewares, FSM, handlers and the
+# background writers all run as in production; only the network ends are
+# replaced. With --dsn the real pool and migrations are used — point it at
+# a throwaway database, the scenarios register users and queue broadcasts.
+
+ADMIN_ID = 1
+RECEIVER_BASE = 1_000_000
+SENDER_BASE = 2_000_000
+BROADCAST_BASE = 5_000_000
+SCENARIOS = ("start", "message", "admin", "broadcast")
+# Not part of "all": message latency while a broadcast holds the bulk lane
+EXTRA_SCENARIOS = ("mixed",)
+# The fake API sees a copy before the bot has its message id and maps it to
+# the conversation; nobody replies faster than this
+THINK_TIME = 0.1
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.spans: dict[str, list[float]] = {}  # label -> [first start, last finish]
+
+    async def timed(self, label: str, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            logging.debug(f"{label} failed", exc_info=True)
+            self.errors[label] += 1
+        finally:
+            finished = time.perf_counter()
+            self.latencies[label].append(finished - started)
+            span = self.spans.setdefault(label, [started, finished])
+            span[1] = max(span[1], finished)
+
+    def report(self):
+        print(f"{'step':<22}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'per s':>10}")
+        for label, values in self.latencies.items():
+            values = sorted(values)
+            first, last = self.spans[label]
+            print(
+                f"{label:<22}{len(values):>8}{self.errors[label]:>8}"
+                f"{_percentile(values, 0.50) * 1000:>10.1f}{_percentile(values, 0.99) * 1000:>10.1f}"
+                f"{values[-1] * 1000:>10.1f}{len(values) / max(last - first, 1e-9):>10.1f}"
+            )
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ⏱ Ochiq tsikl: yangi ish javoblarni kutmasdan, belgilangan RPS bilan boshlanadi
+async def drive(rps: float, duration: float, job) -> float:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks = []
+    index = 0
+    while loop.time() - started < duration:
+        tasks.append(asyncio.create_task(job(index)))
+        index += 1
+        await asyncio.sleep(max(0.0, started + index / rps - loop.time()))
+    await asyncio.gather(*tasks)
+    return loop.time() - started
+
+
+class Bench:
+    def __init__(self, main, api: FakeBotAPI, args):
+        self.main = main
+        self.api = api
+        self.args = args
+        self.updates = UpdateFactory()
+        self.recorder = Recorder()
+        self.receivers: list[tuple[int, str]] = []  # (user_id, token)
+
+    # Polling and the webhook handler pass the dispatcher along; so do we
+    async def feed(self, update):
+        await self.main.dp.feed_update(self.main.bot, update, dispatcher=self.main.dp)
+
+    async def ensure_receivers(self, count: int = 50):
+        if self.receivers:
+            return
+        users = self.main.dp["users"]
+        results = await asyncio.gather(*(
+            users.register(RECEIVER_BASE + i, None, f"Receiver {i}", _now()) for i in range(count)
+        ))
+        self.receivers = [(RECEIVER_BASE + i, token) for i, (token, _) in enumerate(results)]
+
+    # 🚀 /start: yangi foydalanuvchilar ro‘yxatdan o‘tadi
+    async def start(self, index: int):
+        user_id = SENDER_BASE + 500_000 + index
+        await self.recorder.timed("start", self.feed(self.updates.message(user_id, "/start")))
+
+    async def delivered(self, chat_id: int, marker: str) -> int:
+        message_id = await self.api.wait_for(chat_id, marker)
+        if message_id is None:
+            raise TimeoutError(f"{marker!r} never reached {chat_id}")
+        return message_id
+
+    # ✉️ Havola orqali kirish, anonim xabar (har beshinchisi rasm) va reply bilan javob
+    # "question" is the sender's wait for the acknowledgement; "delivered"
+    # is how much later the outbox got the copy to the receiver
+    async def message(self, index: int):
+        user_id = SENDER_BASE + index
+        receiver_id, token = self.receivers[index % len(self.receivers)]
+        marker = f"#{index}#"
+        await self.recorder.timed("start_link", self.feed(self.updates.message(user_id, f"/start {token}")))
+        if index % 5 == 4:
+            update = self.updates.photo(user_id, caption=f"Rasm {marker}")
+        else:
+            update = self.updates.message(user_id, f"Salom, bu {marker} xabar")
+        await self.recorder.timed("question", self.feed(update))
+        delivered = await self.recorder.timed("delivered", self.delivered(receiver_id, marker))
+        if delivered is None:
+            return
+        await asyncio.sleep(THINK_TIME)
+        await self.recorder.timed("reply", self.feed(
+            self.updates.message(receiver_id, f"Javob {marker}", reply_to=delivered)
+        ))
+        await self.recorder.timed("reply_delivered", self.delivered(user_id, f"Javob {marker}"))
+
+    # 👨‍💻 Admin panel: menyu, statistika, foydalanuvchilar ro‘yxati
+    async def admin(self, index: int):
+        await self.recorder.timed("admin", self.feed(self.updates.message(ADMIN_ID, "/admin")))
+        for data in ("admin:stats", "admin:users", "admin:recent_users:a"):
+            await self.recorder.timed(data, self.feed(self.updates.callback(ADMIN_ID, data)))
+
+    # 📢 Broadcast: process_broadcast va Broadcaster oxirigacha
+    async def broadcast(self):
+        users = self.main.dp["users"]
+        count = self.args.broadcast_users
+        for offset in range(0, count, 500):
+            await asyncio.gather(*(
+                users.register(BROADCAST_BASE + i, None, f"Bench {i}", _now())
+                for i in range(offset, min(count, offset + 500))
+            ))
+
+        sends_before = self.api.calls["copyMessage"]
+        started = time.perf_counter()
+        await self.recorder.timed("broadcast_menu", self.feed(self.updates.callback(ADMIN_ID, "admin:broadcast")))
+        await self.recorder.timed("process_broadcast", self.feed(self.updates.message(ADMIN_ID, "Bench broadcast")))
+
+        if await self.api.wait_for(ADMIN_ID, "yakunlandi", timeout=self.args.broadcast_timeout) is None:
+            print(f"broadcast: not finished after {self.args.broadcast_timeout:.0f}s")
+            return
+        elapsed = time.perf_counter() - started
+        sends = self.api.calls["copyMessage"] - sends_before
+        print(f"broadcast: {sends} sends to {count}+ users in {elapsed:.2f}s ({sends / elapsed:.1f}/s)")
+
+    # 🔀 Broadcast fonida anonim xabarlar
+    async def mixed(self):
+        await self.ensure_receivers()
+        broadcast = asyncio.create_task(self.broadcast())
+        await drive(self.args.rps, self.args.duration, self.message)
+        await broadcast
+
+
+def _now() -> datetime:
+    return datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+
+
+# Mean wait for a turn in the outbound scheduler, per lane
+def _lane_waits() -> dict[str, str]:
+    return {
+        labels[0]: f"{series[-1] / series[-2] * 1000:.1f} ms x {series[-2]}"
+        for labels, series in OUTBOUND_WAIT._series.items() if series[-2]
+    }
+
+
+async def run(args):
+    api = FakeBotAPI(latency=args.api_latency, jitter=args.api_jitter, rate_429=args.rate_429,
+                     rate_403=args.rate_403, seed=args.seed)
+    base_url = await api.start()
+
+    # main reads its settings at import time, so the environment goes first
+    os.environ.setdefault("BOT_TOKEN", "100000001:bench")
+    os.environ.setdefault("FSM_STORAGE", "memory")
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["BROADCAST_RATE"] = str(args.broadcast_rate)
+    os.environ["OUTBOUND_RATE"] = str(args.outbound_rate)
+    # Every scenario talks to a handful of chats far faster than Telegram allows
+    for name in ("FLOOD_SENDER_LIMIT", "FLOOD_RECEIVER_LIMIT", "OUTBOUND_CHAT_RATE"):
+        os.environ.setdefault(name, "1000000")
+    if args.dsn:
+        os.environ["DATABASE_URL"] = args.dsn
+    import main
+    from aiogram.client.telegram import TelegramAPIServer
+
+    main.bot.session.api = TelegramAPIServer.from_base(base_url)
+    if args.dsn:
+        db = await main.init_db()
+    else:
+        db = FakeDatabase(latency=args.db_latency, max_size=main.DB_POOL_MAX, admins=(ADMIN_ID,))
+    await main.start_services(db)
+
+    bench = Bench(main, api, args)
+    try:
+        await main.get_user_token(ADMIN_ID, "admin", "Bench Admin")
+        if args.dsn:
+            async with db.acquire() as conn:
+                await conn.execute("UPDATE users SET is_admin = TRUE WHERE user_id = $1", ADMIN_ID)
+
+        scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+        for scenario in scenarios:
+            print(f"== {scenario}")
+            if scenario in ("broadcast", "mixed"):
+                await getattr(bench, scenario)()
+                continue
+            if scenario == "message":
+                await bench.ensure_receivers()
+            await drive(args.rps, args.duration, getattr(bench, scenario))
+
+        print()
+        bench.recorder.report()
+        print()
+        print("api calls:", dict(api.calls.most_common()))
+        print("injected:", dict(api.injected))
+        if isinstance(db, FakeDatabase):
+            print("db queries:", dict(db.queries.most_common()))
+        print("outbound wait:", _lane_waits())
+    finally:
+        await main.stop_services()
+        await main.bot.session.close()
+        await api.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the bot against a fake Bot API")
+    parser.add_argument("--scenario", choices=SCENARIOS + EXTRA_SCENARIOS + ("all",), default="all")
+    parser.add_argument("--rps", type=float, default=50.0, help="Scenario iterations started per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--dsn", help="Use this Postgres instead of the in-memory fake")
+    parser.add_argument("--db-latency", type=float, default=0.0005, help="Fake DB seconds per query")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Mean Bot API seconds per call")
+    parser.add_argument("--api-jitter", type=float, default=0.01)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of sends answered with 429")
+    parser.add_argument("--rate-403", type=float, default=0.0, help="Share of sends answered with 403")
+    parser.add_argument("--broadcast-users", type=int, default=2000)
+    parser.add_argument("--broadcast-rate", type=float, default=1000.0)
+    parser.add_argument("--broadcast-timeout", type=float, default=120.0)
+    parser.add_argument("--outbound-rate", type=float, default=2000.0, help="Global Bot API sends per second")
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(parse_args()))
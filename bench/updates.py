@@ -0,0 +1,61 @@
+import itertools
+import time
+
+from aiogram.types import CallbackQuery, Chat, Message, PhotoSize, Update, User
+
+from bench.fake_api import BOT_ID
+
+
+# 📦 Sintetik Update'lar: har biri yangi update_id va message_id bilan
+class UpdateFactory:
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+
+    @staticmethod
+    def user(user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name=f"User {user_id}", username=f"user{user_id}")
+
+    @staticmethod
+    def _from_bot(chat_id: int, message_id: int) -> Message:
+        return Message(
+            message_id=message_id,
+            date=int(time.time()),
+            chat=Chat(id=chat_id, type="private"),
+            from_user=User(id=BOT_ID, is_bot=True, first_name="Bench"),
+            text="…",
+        )
+
+    def _message(self, user_id: int, **fields) -> Message:
+        return Message(
+            message_id=next(self._message_ids),
+            date=int(time.time()),
+            chat=Chat(id=user_id, type="private"),
+            from_user=self.user(user_id),
+            **fields,
+        )
+
+    # reply_to: id of a message the bot sent to this chat, for a native reply
+    def message(self, user_id: int, text: str, reply_to: int | None = None) -> Update:
+        reply = self._from_bot(user_id, reply_to) if reply_to is not None else None
+        return Update(update_id=next(self._update_ids), message=self._message(
+            user_id, text=text, reply_to_message=reply
+        ))
+
+    def photo(self, user_id: int, caption: str | None = None, media_group_id: str | None = None) -> Update:
+        file_id = f"photo-{next(self._message_ids)}"
+        photo = [PhotoSize(file_id=file_id, file_unique_id=file_id, width=640, height=480)]
+        return Update(update_id=next(self._update_ids), message=self._message(
+            user_id, photo=photo, caption=caption, media_group_id=media_group_id
+        ))
+
+    def callback(self, user_id: int, data: str) -> Update:
+        # The button sits under a message the bot sent earlier
+        return Update(update_id=next(self._update_ids), callback_query=CallbackQuery(
+            id=str(next(self._callback_ids)),
+            from_user=self.user(user_id),
+            chat_instance=str(user_id),
+            message=self._from_bot(user_id, next(self._message_ids)),
+            data=data,
+        ))
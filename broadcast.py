@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+from delivery import MAX_CONSECUTIVE_FAILURES, record_delivery_results
+from outbound import LANE, use_lane
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100  # Recipients fetched per keyset page; also the resend window after a crash
+LEASE_SECONDS = 60  # A job whose worker stopped heartbeating is picked up again after this
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4  # On a timer: a page in the bulk lane can outlast the lease
+POLL_INTERVAL = 10.0
+PROGRESS_INTERVAL = 5.0
+MAX_RETRIES = 5
+
+
+class LeaseLost(Exception):
+    pass
+
+
+# 📢 Yangi broadcast yaratish
+async def create_broadcast(pool, admin_chat_id: int, from_chat_id: int, message_id: int,
+                           progress_message_id: int | None = None) -> int:
+    async with pool.acquire() as conn:
+        return await conn.fetchval("""
+            INSERT INTO broadcasts (admin_chat_id, from_chat_id, message_id, progress_message_id, total)
+            VALUES ($1, $2, $3, $4, (
+                SELECT COUNT(*) FROM users WHERE blocked_at IS NULL AND failure_count < $5
+            ))
+            RETURNING id
+        """, admin_chat_id, from_chat_id, message_id, progress_message_id, MAX_CONSECUTIVE_FAILURES)
+
+
+class Broadcaster:
+    def __init__(self, bot: Bot, pool, rate: float = 30.0, batch_size: int = BATCH_SIZE):
+        self.bot = bot
+        self.pool = pool
+        self.bucket = TokenBucket(rate)
+        self.batch_size = batch_size
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _run(self):
+        LANE.set("bulk")
+        while True:
+            try:
+                job = await self._claim()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except LeaseLost as e:
+                logger.warning(f"Broadcast {e} was taken over by another worker")
+            except Exception:
+                logger.exception("Broadcast worker failed")
+                await asyncio.sleep(POLL_INTERVAL)
+
+    # 🔒 Navbatdagi ishni olish (crash bo‘lsa, lease tugagach qayta olinadi)
+    async def _claim(self):
+        async with self.pool.acquire() as conn:
+            return await conn.fetchrow("""
+                UPDATE broadcasts
+                SET status = 'running', locked_by = $1, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM broadcasts
+                    WHERE status IN ('pending', 'running')
+                      AND (locked_by IS NULL OR locked_by = $1
+                           OR heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => $2))
+                    ORDER BY id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING *
+            """, self.worker_id, LEASE_SECONDS)
+
+    async def _process(self, job):
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"], lost))
+        try:
+            await self._process_pages(job, lost)
+        finally:
+            heartbeat.cancel()
+
+    # Every write to the job checks the lease is still ours; once another
+    # worker has reclaimed the job this one stops without touching it
+    async def _heartbeat(self, job_id: int, lost: asyncio.Event):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                async with self.pool.acquire() as conn:
+                    status = await conn.execute("""
+                        UPDATE broadcasts SET heartbeat_at = CURRENT_TIMESTAMP
+                        WHERE id = $1 AND locked_by = $2
+                    """, job_id, self.worker_id)
+            except Exception:
+                logger.exception(f"Broadcast {job_id} heartbeat failed")
+                continue
+            if status == "UPDATE 0":
+                lost.set()
+                return
+
+    async def _process_pages(self, job, lost: asyncio.Event):
+        job_id = job["id"]
+        cursor = job["last_user_id"]
+        sent = job["sent"]
+        failed = job["failed"]
+        last_progress = time.monotonic()
+
+        while True:
+            if lost.is_set():
+                raise LeaseLost(job_id)
+            async with self.pool.acquire() as conn:
+                # Chats that blocked the bot or keep failing are not worth a send
+                rows = await conn.fetch("""
+                    SELECT user_id FROM users
+                    WHERE user_id > $1 AND blocked_at IS NULL AND failure_count < $3
+                    ORDER BY user_id
+                    LIMIT $2
+                """, cursor, self.batch_size, MAX_CONSECUTIVE_FAILURES)
+            if not rows:
+                break
+
+            user_ids = [row["user_id"] for row in rows]
+            errors = await asyncio.gather(*(self._send(job, user_id, lost) for user_id in user_ids))
+            cursor = user_ids[-1]
+            batch_failed = sum(1 for error in errors if error is not None)
+            sent += len(user_ids) - batch_failed
+            failed += batch_failed
+
+            # Outcomes and the cursor move together, so a restart resumes
+            # right after the last recorded page
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    status = await conn.execute("""
+                        UPDATE broadcasts
+                        SET last_user_id = $2, sent = $3, failed = $4, heartbeat_at = CURRENT_TIMESTAMP
+                        WHERE id = $1 AND locked_by = $5
+                    """, job_id, cursor, sent, failed, self.worker_id)
+                    if status == "UPDATE 0":
+                        raise LeaseLost(job_id)
+                    await conn.executemany("""
+                        INSERT INTO broadcast_deliveries (broadcast_id, user_id, error)
+                        VALUES ($1, $2, $3)
+                        ON CONFLICT (broadcast_id, user_id) DO NOTHING
+                    """, [(job_id, user_id, error) for user_id, error in zip(user_ids, errors)])
+                    await record_delivery_results(
+                        conn,
+                        delivered=[user_id for user_id, error in zip(user_ids, errors) if error is None],
+                        failed={user_id: (error, 1) for user_id, error in zip(user_ids, errors) if error}
+                    )
+
+            if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                await self._report_progress(job, sent + failed)
+
+        async with self.pool.acquire() as conn:
+            status = await conn.execute("""
+                UPDATE broadcasts
+                SET status = 'done', locked_by = NULL, finished_at = CURRENT_TIMESTAMP
+                WHERE id = $1 AND locked_by = $2
+            """, job_id, self.worker_id)
+        if status == "UPDATE 0":
+            raise LeaseLost(job_id)
+
+        try:
+            with use_lane("admin"):
+                await self.bot.send_message(
+                    job["admin_chat_id"],
+                    f"<b>✅ Broadcast yakunlandi!</b>\n\n"
+                    f"📬 Yuborildi: <b>{sent}</b>\n"
+                    f"❌ Yuborilmadi: <b>{failed}</b>",
+                    parse_mode=ParseMode.HTML
+                )
+        except TelegramAPIError as e:
+            logger.warning(f"Could not report broadcast {job_id} result: {e}")
+
+    async def _send(self, job, user_id: int, lost: asyncio.Event) -> str | None:
+        for _ in range(MAX_RETRIES):
+            await self.bucket.acquire()
+            if lost.is_set():
+                return LeaseLost.__name__  # The page is not recorded anyway
+            try:
+                await self.bot.copy_message(
+                    chat_id=user_id,
+                    from_chat_id=job["from_chat_id"],
+                    message_id=job["message_id"]
+                )
+                return None
+            except TelegramRetryAfter as e:
+                self.bucket.penalize(e.retry_after)
+            except TelegramAPIError as e:
+                return type(e).__name__
+        return TelegramRetryAfter.__name__
+
+    async def _report_progress(self, job, done: int):
+        if not job["progress_message_id"]:
+            return
+        try:
+            with use_lane("admin"):
+                await self.bot.edit_message_text(
+                    f"<i>📬 Yuborilmoqda: {done} / {job['total']} foydalanuvchi...</i>",
+                    chat_id=job["admin_chat_id"],
+                    message_id=job["progress_message_id"],
+                    parse_mode=ParseMode.HTML
+                )
+        except TelegramAPIError as e:
+            logger.debug(f"Progress update skipped: {e}")
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+# 🧠 LRU + TTL kesh
+class TTLCache:
+    def __init__(self, name: str, maxsize: int = 10_000, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        item = self._data.get(key)
+        if item is not None:
+            expires_at, value = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# None is cached too: "no such token" is the common answer for bad links
+token_cache = TTLCache("token", maxsize=50_000, ttl=300.0)  # token -> users row
+user_token_cache = TTLCache("user_token", maxsize=50_000, ttl=300.0)  # user_id -> token
+admin_cache = TTLCache("admin", maxsize=10_000, ttl=60.0)  # user_id -> bool
+count_cache = TTLCache("count", maxsize=100, ttl=60.0)  # user browser filter -> (count, approximate)
+search_cache = TTLCache("search", maxsize=1_000, ttl=120.0)  # search key -> (query, matches, truncated)
+
+CACHES = (token_cache, user_token_cache, admin_cache, count_cache, search_cache)
+
+
+def cache_stats() -> list[dict]:
+    return [cache.stats() for cache in CACHES]
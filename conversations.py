@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+def other_party(conversation, user_id: int) -> int | None:
+    if user_id == conversation["sender_id"]:
+        return conversation["receiver_id"]
+    if user_id == conversation["receiver_id"]:
+        return conversation["sender_id"]
+    return None
+
+
+# 💬 Anonim suhbatlar: yetkazilgan xabar -> suhbat -> ikkinchi tomon
+class ConversationStore:
+    # Every copy the bot delivers (the header message too) is mapped to its
+    # conversation, so a native reply to any of them reaches the other
+    # party without a new /start. Mappings are written in batches in the
+    # background; until a batch lands, lookups are answered from memory.
+    def __init__(self, pool, flush_interval: float = 1.0, retention_days: int = 30,
+                 sweep_interval: float = 3600.0):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.retention = timedelta(days=retention_days)
+        self.sweep_interval = sweep_interval
+        self._pairs = TTLCache("conversation_pairs", maxsize=50_000, ttl=3600.0)  # (sender, receiver) -> id
+        self._conversations = TTLCache("conversations", maxsize=50_000, ttl=3600.0)  # id -> row
+        self._pending: dict[tuple[int, int], int] = {}  # (chat_id, message_id) -> conversation id
+        self._flushing: dict[tuple[int, int], int] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def open(self, sender_id: int, receiver_id: int) -> int:
+        conversation_id = self._pairs.get((sender_id, receiver_id))
+        if conversation_id is not MISSING:
+            return conversation_id
+        for _ in range(MAX_ATTEMPTS):
+            conversation_id = await self.pool.val("open_conversation", sender_id, receiver_id)
+            if conversation_id is not None:
+                break
+        else:
+            raise RuntimeError(f"Could not open a conversation {sender_id} -> {receiver_id}")
+        self._pairs.set((sender_id, receiver_id), conversation_id)
+        self._conversations.set(
+            conversation_id, {"id": conversation_id, "sender_id": sender_id, "receiver_id": receiver_id}
+        )
+        return conversation_id
+
+    async def get(self, conversation_id: int):
+        conversation = self._conversations.get(conversation_id)
+        if conversation is MISSING:
+            conversation = await self.pool.row("conversation", conversation_id)
+            # A miss is not cached: an id that is not there yet may be soon
+            if conversation is not None:
+                self._conversations.set(conversation_id, conversation)
+        return conversation
+
+    async def by_message(self, chat_id: int, message_id: int):
+        key = (chat_id, message_id)
+        conversation_id = self._pending.get(key) or self._flushing.get(key)
+        if conversation_id is not None:
+            return await self.get(conversation_id)
+        conversation = await self.pool.row("conversation_by_message", chat_id, message_id)
+        if conversation is not None:
+            self._conversations.set(conversation["id"], conversation)
+        return conversation
+
+    def remember(self, conversation_id: int, chat_id: int, message_ids: list[int]):
+        for message_id in message_ids:
+            self._pending[(chat_id, message_id)] = conversation_id
+
+    async def flush(self):
+        if not self._pending:
+            return
+        self._flushing, self._pending = self._pending, {}
+        keys = list(self._flushing)
+        now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+        try:
+            await self.pool.status(
+                "remember_conversation_messages",
+                [chat_id for chat_id, _ in keys],
+                [message_id for _, message_id in keys],
+                [self._flushing[key] for key in keys],
+                now
+            )
+        except Exception:
+            # Keep the batch for the next flush rather than losing the threads
+            self._pending = {**self._flushing, **self._pending}
+            raise
+        finally:
+            self._flushing = {}
+
+    async def expire(self):
+        cutoff = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None) - self.retention
+        await self.pool.status("expire_conversation_messages", cutoff)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time() + self.sweep_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if loop.time() >= next_sweep:
+                    next_sweep = loop.time() + self.sweep_interval
+                    await self.expire()
+            except Exception:
+                logger.exception("Failed to write conversation messages")
@@ -0,0 +1,366 @@
+import asyncio
+import logging
+import time
+
+import asyncpg
+from asyncpg.exceptions import (
+    AdminShutdownError, CannotConnectNowError, ConnectionDoesNotExistError, InterfaceError,
+    InvalidCachedStatementError, PostgresConnectionError, ReadOnlySQLTransactionError,
+)
+
+from metrics import DB_ACQUIRE_SECONDS, DB_QUERY_ERRORS, DB_QUERY_SECONDS, Gauge, instrument_connection
+
+logger = logging.getLogger(__name__)
+
+# Migrations, partition maintenance and exports can legitimately run for
+# minutes; they pass this instead of inheriting command_timeout
+LONG_TIMEOUT = 3600.0
+
+# Errors a failover produces: the old primary going away, refusing new
+# sessions while it restarts, or answering as a read-only standby
+FAILOVER_ERRORS = (
+    ConnectionDoesNotExistError, PostgresConnectionError, CannotConnectNowError, AdminShutdownError,
+    ReadOnlySQLTransactionError, InterfaceError, OSError,
+)
+
+DB_UP = Gauge("bot_db_up", "1 if the last health check reached a writable primary")
+DB_POOL_CONNECTIONS = Gauge("bot_db_pool_connections", "Pool connections by state", ("state",))
+
+
+# 📚 Nomlangan so‘rovlar reyestri
+class Query:
+    def __init__(self, sql: str, timeout: float = 5.0, idempotent: bool = True):
+        self.sql = sql
+        self.timeout = timeout
+        # Only idempotent queries are retried after a connection error
+        self.idempotent = idempotent
+
+
+QUERIES = {
+    # An alias (the old link after a rotation) answers until it expires; a
+    # live token wins over an alias with the same text
+    "user_by_token": Query("""
+        SELECT user_id FROM (
+            SELECT user_id, 0 AS priority FROM users WHERE token = $1
+            UNION ALL
+            SELECT user_id, 1 FROM token_aliases WHERE token = $1 AND expires_at > $2
+        ) AS t
+        ORDER BY priority
+        LIMIT 1
+    """, timeout=2.0),
+    # Inserts new users and refreshes username/name only when they changed.
+    # An unchanged existing row is not updated, so the second branch reads
+    # its token instead; created is true for the rows that were inserted.
+    "register_users": Query("""
+        WITH input AS (
+            SELECT * FROM unnest($1::bigint[], $2::text[], $3::text[], $4::text[], $5::timestamp[])
+                AS i(user_id, username, name, token, created_at)
+        ), upserted AS (
+            INSERT INTO users (user_id, username, name, token, created_at)
+            SELECT user_id, username, name, token, created_at FROM input
+            ON CONFLICT (user_id) DO UPDATE
+            SET username = EXCLUDED.username, name = EXCLUDED.name
+            WHERE (users.username, users.name) IS DISTINCT FROM (EXCLUDED.username, EXCLUDED.name)
+            RETURNING user_id, token, (xmax = 0) AS created
+        )
+        SELECT user_id, token, created FROM upserted
+        UNION ALL
+        SELECT u.user_id, u.token, FALSE
+        FROM users u
+        JOIN input i ON i.user_id = u.user_id
+        WHERE NOT EXISTS (SELECT 1 FROM upserted p WHERE p.user_id = u.user_id)
+    """, timeout=5.0),
+    # users.token is unique on its own; a new token that is still someone's
+    # alias leaves everything as it was and comes back as new_token NULL,
+    # so the caller retries with another one. No row: no such user
+    "rotate_token": Query("""
+        WITH old AS (
+            SELECT user_id, token FROM users WHERE user_id = $1 FOR UPDATE
+        ), free AS (
+            SELECT NOT EXISTS (SELECT 1 FROM token_aliases WHERE token = $2) AS ok
+        ), alias AS (
+            INSERT INTO token_aliases (token, user_id, expires_at)
+            SELECT token, user_id, $3 FROM old, free WHERE token IS NOT NULL AND free.ok
+            ON CONFLICT (token) DO UPDATE SET user_id = EXCLUDED.user_id, expires_at = EXCLUDED.expires_at
+        ), updated AS (
+            UPDATE users u SET token = $2
+            FROM old, free
+            WHERE u.user_id = old.user_id AND free.ok
+            RETURNING old.token AS old_token, u.token AS new_token
+        )
+        SELECT updated.old_token, updated.new_token FROM old LEFT JOIN updated ON TRUE
+    """, idempotent=False),
+    "expire_token_aliases": Query("DELETE FROM token_aliases WHERE expires_at <= $1", timeout=30.0),
+    "is_admin": Query("SELECT is_admin FROM users WHERE user_id = $1", timeout=2.0),
+    "user_info": Query("SELECT user_id, username, name, is_admin, created_at FROM users WHERE user_id = $1"),
+    "muted_until": Query("SELECT muted_until FROM muted_users WHERE user_id = $1"),
+    "mute_user": Query("""
+        INSERT INTO muted_users (user_id, muted_until, reason)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (user_id) DO UPDATE
+        SET muted_until = $2, reason = $3, created_at = CURRENT_TIMESTAMP
+    """),
+    "unmute_user": Query("DELETE FROM muted_users WHERE user_id = $1"),
+    # A concurrent first message for the same pair can make both branches
+    # come back empty; ConversationStore.open retries that case
+    "open_conversation": Query("""
+        WITH inserted AS (
+            INSERT INTO conversations (sender_id, receiver_id) VALUES ($1, $2)
+            ON CONFLICT (sender_id, receiver_id) DO NOTHING
+            RETURNING id
+        )
+        SELECT id FROM inserted
+        UNION ALL
+        SELECT id FROM conversations WHERE sender_id = $1 AND receiver_id = $2
+        LIMIT 1
+    """, timeout=2.0),
+    "conversation": Query("SELECT id, sender_id, receiver_id FROM conversations WHERE id = $1", timeout=2.0),
+    "conversation_by_message": Query("""
+        SELECT c.id, c.sender_id, c.receiver_id
+        FROM conversation_messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE m.chat_id = $1 AND m.message_id = $2
+    """, timeout=2.0),
+    "remember_conversation_messages": Query("""
+        INSERT INTO conversation_messages (chat_id, message_id, conversation_id, created_at)
+        SELECT m.chat_id, m.message_id, m.conversation_id, $4
+        FROM unnest($1::bigint[], $2::bigint[], $3::bigint[]) AS m(chat_id, message_id, conversation_id)
+        ON CONFLICT (chat_id, message_id) DO NOTHING
+    """),
+    "expire_conversation_messages": Query(
+        "DELETE FROM conversation_messages WHERE created_at < $1", timeout=60.0
+    ),
+    # The idempotency key makes a redelivered update a no-op (no row back)
+    "enqueue_outbox": Query("""
+        INSERT INTO outbox (idempotency_key, sender_id, target_id, conversation_id, parts, next_attempt_at, created_at)
+        VALUES ($1, $2, $3, $4, $5::jsonb, $6, $6)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id
+    """),
+    "claim_outbox": Query("""
+        UPDATE outbox
+        SET status = 'sending', locked_by = $1, locked_at = $2, attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM outbox
+            WHERE (status = 'pending' AND next_attempt_at <= $2)
+               OR (status = 'sending' AND locked_at < $2 - make_interval(secs => $3))
+            ORDER BY next_attempt_at
+            LIMIT $4
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, sender_id, target_id, conversation_id, parts, attempts
+    """, idempotent=False),
+    # Rows another worker took over after the lease ran out are left alone
+    "finish_outbox": Query("""
+        UPDATE outbox AS o
+        SET status          = r.status,
+            next_attempt_at = COALESCE(r.next_attempt_at, o.next_attempt_at),
+            last_error      = r.error,
+            locked_by       = NULL,
+            locked_at       = NULL,
+            sent_at         = CASE WHEN r.status = 'sent' THEN $5 END
+        FROM unnest($1::bigint[], $2::text[], $3::timestamp[], $4::text[]) AS r(id, status, next_attempt_at, error)
+        WHERE o.id = r.id AND o.locked_by = $6
+    """),
+    "expire_outbox": Query(
+        "DELETE FROM outbox WHERE status IN ('sent', 'dead') AND created_at < $1", timeout=60.0
+    ),
+    # Admin search: an exact username first, then the closest matches. $1
+    # is an already escaped LIKE pattern, $2 the lowercased query
+    "search_users_trigram": Query("""
+        SELECT user_id, username, name, created_at
+        FROM users
+        WHERE username ILIKE $1 OR name ILIKE $1
+        ORDER BY (lower(username) = $2) IS TRUE DESC,
+                 GREATEST(similarity(username, $2), similarity(name, $2)) DESC,
+                 user_id
+        LIMIT $3
+    """),
+    "search_users_prefix": Query("""
+        SELECT user_id, username, name, created_at
+        FROM users
+        WHERE lower(username) LIKE $1 OR lower(name) LIKE $1
+        ORDER BY (lower(username) = $2) IS TRUE DESC, (lower(username) LIKE $1) IS TRUE DESC,
+                 length(name), user_id
+        LIMIT $3
+    """),
+}
+
+
+# 🔌 Nomlangan so‘rovlarni bir marta tayyorlaydigan ulanish
+class Connection(asyncpg.Connection):
+    __slots__ = ("_named",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._named: dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+
+    async def _statement(self, name: str):
+        statement = self._named.get(name)
+        if statement is None:
+            statement = self._named[name] = await self.prepare(QUERIES[name].sql)
+        return statement
+
+    async def _run(self, name: str, method: str, args: tuple):
+        # Prepared statements bypass the query logger, so they are timed
+        # here, labelled with the query name
+        started = time.perf_counter()
+        try:
+            for attempt in range(2):
+                statement = await self._statement(name)
+                try:
+                    return await getattr(statement, method)(*args, timeout=QUERIES[name].timeout)
+                except InvalidCachedStatementError:
+                    # A migration changed a table under the prepared plan
+                    self._named.pop(name, None)
+                    if attempt:
+                        raise
+        except Exception as e:
+            DB_QUERY_ERRORS.inc(type(e).__name__)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(name, value=time.perf_counter() - started)
+
+    async def row(self, name: str, *args):
+        return await self._run(name, "fetchrow", args)
+
+    async def rows(self, name: str, *args):
+        return await self._run(name, "fetch", args)
+
+    async def val(self, name: str, *args):
+        return await self._run(name, "fetchval", args)
+
+    async def status(self, name: str, *args) -> str:
+        await self._run(name, "fetch", args)
+        return self._named[name].get_statusmsg()
+
+
+class _Acquire:
+    def __init__(self, pool, timeout: float):
+        self._context = pool.acquire(timeout=timeout)
+
+    async def __aenter__(self) -> Connection:
+        started = time.perf_counter()
+        conn = await self._context.__aenter__()
+        DB_ACQUIRE_SECONDS.observe(value=time.perf_counter() - started)
+        return conn
+
+    async def __aexit__(self, *exc_info):
+        return await self._context.__aexit__(*exc_info)
+
+
+# 🗄 Pool, timeout'lar, health check va failover'dan keyin qayta ulanish
+class Database:
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10, command_timeout: float = 30.0,
+                 acquire_timeout: float = 10.0, statement_cache_size: int = 256,
+                 max_inactive_lifetime: float = 300.0, retries: int = 3, health_interval: float = 10.0):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.command_timeout = command_timeout
+        self.acquire_timeout = acquire_timeout
+        self.statement_cache_size = statement_cache_size
+        self.max_inactive_lifetime = max_inactive_lifetime
+        self.retries = retries
+        self.health_interval = health_interval
+        self.pool: asyncpg.Pool | None = None
+        self.healthy = False
+        self._task: asyncio.Task | None = None
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            command_timeout=self.command_timeout,
+            statement_cache_size=self.statement_cache_size,
+            max_inactive_connection_lifetime=self.max_inactive_lifetime,
+            connection_class=Connection,
+            init=instrument_connection,
+            # With a multi-host DSN this skips standbys after a failover
+            target_session_attrs="read-write",
+        )
+        self.healthy = True
+        DB_UP.set(value=1)
+        DB_POOL_CONNECTIONS.track("open", callback=self.pool.get_size)
+        DB_POOL_CONNECTIONS.track("idle", callback=self.pool.get_idle_size)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.pool.close()
+
+    # Waiting for a connection is bounded too: an exhausted pool fails the
+    # handler after acquire_timeout instead of stacking up forever
+    def acquire(self, timeout: float | None = None) -> _Acquire:
+        return _Acquire(self.pool, timeout if timeout is not None else self.acquire_timeout)
+
+    async def row(self, name: str, *args):
+        return await self._with_retry(name, "row", args)
+
+    async def rows(self, name: str, *args):
+        return await self._with_retry(name, "rows", args)
+
+    async def val(self, name: str, *args):
+        return await self._with_retry(name, "val", args)
+
+    async def status(self, name: str, *args) -> str:
+        return await self._with_retry(name, "status", args)
+
+    async def _with_retry(self, name: str, method: str, args: tuple):
+        attempt = 0
+        while True:
+            try:
+                async with self.acquire() as conn:
+                    return await getattr(conn, method)(name, *args)
+            except FAILOVER_ERRORS as e:
+                if isinstance(e, ReadOnlySQLTransactionError):
+                    await self._reconnect()
+                if not QUERIES[name].idempotent or attempt >= self.retries:
+                    raise
+                attempt += 1
+                logger.warning(f"Query {name} failed with {type(e).__name__}, retry {attempt}/{self.retries}")
+                await asyncio.sleep(min(0.2 * 2 ** attempt, 2.0))
+
+    # 🩺 Health check: ulanish bormi va u yozish mumkin bo‘lgan primary'mi
+    async def check(self) -> dict:
+        started = time.perf_counter()
+        try:
+            async with self.acquire(timeout=2.0) as conn:
+                in_recovery = await conn.fetchval("SELECT pg_is_in_recovery()", timeout=2.0)
+        except (asyncio.TimeoutError, *FAILOVER_ERRORS) as e:
+            return {"ok": False, "error": type(e).__name__}
+        return {
+            "ok": not in_recovery,
+            "in_recovery": in_recovery,
+            "latency": time.perf_counter() - started,
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                health = await self.check()
+                if not health["ok"]:
+                    logger.warning(f"Database health check failed: {health}")
+                    await self._reconnect()
+                elif not self.healthy:
+                    logger.info("Database is reachable again")
+                self.healthy = health["ok"]
+                DB_UP.set(value=int(self.healthy))
+            except Exception:
+                logger.exception("Database health check crashed")
+
+    async def _reconnect(self):
+        # Connections to the old primary are closed as they come back to
+        # the pool; new ones resolve the DSN again
+        await self.pool.expire_connections()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+MAX_CONSECUTIVE_FAILURES = 5  # Chats that failed this many times in a row are skipped by broadcasts
+BLOCKING_ERRORS = {"TelegramForbiddenError"}
+# Rate limits and network/server hiccups say nothing about the chat itself
+TRANSIENT_ERRORS = {"TelegramRetryAfter", "TelegramNetworkError", "TelegramServerError"}
+
+
+# 📝 Yetkazish natijalarini bitta so‘rov bilan yozish
+# `delivered` is an iterable of user ids, `failed` maps user_id -> (error, count)
+async def record_delivery_results(conn, delivered, failed):
+    failed = {user_id: value for user_id, value in failed.items() if value[0] not in TRANSIENT_ERRORS}
+    if failed:
+        now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+        user_ids = list(failed)
+        await conn.execute("""
+            UPDATE users AS u
+            SET failure_count = u.failure_count + f.count,
+                last_error    = f.error,
+                blocked_at    = CASE WHEN f.blocked THEN COALESCE(u.blocked_at, $5) ELSE u.blocked_at END
+            FROM unnest($1::bigint[], $2::text[], $3::int[], $4::bool[]) AS f(user_id, error, count, blocked)
+            WHERE u.user_id = f.user_id
+        """,
+            user_ids,
+            [failed[user_id][0] for user_id in user_ids],
+            [failed[user_id][1] for user_id in user_ids],
+            [failed[user_id][0] in BLOCKING_ERRORS for user_id in user_ids],
+            now
+        )
+
+    delivered = list(delivered)
+    if delivered:
+        # Only rows that actually carry failure state are rewritten
+        await conn.execute("""
+            UPDATE users
+            SET failure_count = 0, last_error = NULL, blocked_at = NULL
+            WHERE user_id = ANY($1::bigint[])
+              AND (failure_count > 0 OR blocked_at IS NOT NULL)
+        """, delivered)
+
+
+# 📦 Handlerlardan kelgan natijalarni yig‘ib, fon rejimida yozish
+class DeliveryTracker:
+    def __init__(self, pool, flush_interval: float = 5.0):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self._delivered: set[int] = set()
+        self._failed: dict[int, tuple[str, int]] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._delivered) + len(self._failed)
+
+    def delivered(self, user_id: int):
+        self._failed.pop(user_id, None)
+        self._delivered.add(user_id)
+
+    def failed(self, user_id: int, error: str):
+        self._delivered.discard(user_id)
+        _, count = self._failed.get(user_id, (None, 0))
+        self._failed[user_id] = (error, count + 1)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def flush(self):
+        if not self._delivered and not self._failed:
+            return
+        delivered, self._delivered = self._delivered, set()
+        failed, self._failed = self._failed, {}
+        try:
+            async with self.pool.acquire() as conn:
+                await record_delivery_results(conn, delivered, failed)
+        except Exception:
+            self._restore(delivered, failed)
+            raise
+
+    # Results recorded since the swap are newer and win over the batch
+    def _restore(self, delivered: set[int], failed: dict[int, tuple[str, int]]):
+        for user_id in delivered:
+            if user_id not in self._failed:
+                self._delivered.add(user_id)
+        for user_id, (error, count) in failed.items():
+            if user_id in self._delivered:
+                continue
+            newer_error, newer_count = self._failed.get(user_id, (error, 0))
+            self._failed[user_id] = (newer_error, count + newer_count)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush delivery state")
@@ -0,0 +1,155 @@
+import asyncio
+import gzip
+import logging
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import FSInputFile
+
+from db import LONG_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+PROGRESS_INTERVAL = 5.0
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # sendDocument limit of the cloud Bot API
+
+# Link tokens are left out: anyone holding one can write to its owner
+USERS_SQL = """
+    SELECT user_id, username, name, is_admin, created_at, blocked_at, failure_count
+    FROM users
+    ORDER BY user_id
+"""
+MESSAGES_SQL = """
+    SELECT id, sender_id, receiver_id, content_type, message, sent_at
+    FROM message_log
+    WHERE sent_at >= $1 AND sent_at < $2
+    ORDER BY sent_at, id
+"""
+
+
+def _megabytes(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+class _GzipChunkWriter:
+    # asyncpg awaits write() for every chunk it reads, so the copy runs no
+    # faster than compression and only one chunk is in memory at a time.
+    # Compression runs in a thread to keep the event loop free.
+    def __init__(self, path: str):
+        self._file = gzip.open(path, "wb", compresslevel=6)
+        self.bytes = 0
+        self.lines = 0
+
+    async def write(self, chunk: bytes):
+        await asyncio.to_thread(self._file.write, chunk)
+        self.bytes += len(chunk)
+        self.lines += chunk.count(b"\n")
+
+    def close(self):
+        self._file.close()
+
+
+# 📤 users / message_log eksporti: COPY -> gzip fayl -> admin chatiga hujjat
+class Exporter:
+    # One export runs at a time per process. A pool connection is held for
+    # the COPY only; progress is edited from a separate task, and the upload
+    # starts after the connection is back in the pool. In jsonl, every row is
+    # one row_to_json line; CSV mode with control characters for delimiter
+    # and quote passes the JSON through COPY unescaped.
+    def __init__(self, bot: Bot, pool, export_dir: str | None = None):
+        self.bot = bot
+        self.pool = pool
+        self.export_dir = export_dir
+        self._task: asyncio.Task | None = None
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def stop(self):
+        if self.busy:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # Returns False if another export is still running
+    def export_users(self, chat_id: int, progress_message_id: int, fmt: str) -> bool:
+        return self._submit(chat_id, progress_message_id, fmt, "users", USERS_SQL, ())
+
+    # Both days are included; sent_at is naive Tashkent time like the days
+    def export_messages(self, chat_id: int, progress_message_id: int, fmt: str, first_day: date,
+                        last_day: date) -> bool:
+        start = datetime.combine(first_day, time.min)
+        end = datetime.combine(last_day + timedelta(days=1), time.min)
+        name = f"messages_{first_day}_{last_day}"
+        return self._submit(chat_id, progress_message_id, fmt, name, MESSAGES_SQL, (start, end))
+
+    def _submit(self, chat_id: int, progress_message_id: int, fmt: str, name: str, sql: str, args: tuple) -> bool:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}")
+        if self.busy:
+            return False
+        self._task = asyncio.create_task(self._run(chat_id, progress_message_id, fmt, name, sql, args))
+        return True
+
+    async def _run(self, chat_id: int, progress_message_id: int, fmt: str, name: str, sql: str, args: tuple):
+        filename = f"{name}.{fmt}.gz"
+        fd, path = tempfile.mkstemp(prefix="export-", suffix=f".{fmt}.gz", dir=self.export_dir)
+        os.close(fd)
+        try:
+            writer = _GzipChunkWriter(path)
+            reporter = asyncio.create_task(self._report(chat_id, progress_message_id, writer))
+            try:
+                await self._copy(sql, args, fmt, writer)
+            finally:
+                reporter.cancel()
+                writer.close()
+
+            size = os.path.getsize(path)
+            summary = f"{_megabytes(writer.bytes)} ({_megabytes(size)} gzip), ~{writer.lines} qator"
+            if size > MAX_UPLOAD_BYTES:
+                await self._progress(
+                    chat_id, progress_message_id,
+                    f"⚠️ Eksport Telegram limitidan katta: {summary}. Oraliqni qisqartiring."
+                )
+                return
+            await self._progress(chat_id, progress_message_id, f"<i>📤 Yuklanmoqda: {summary}...</i>")
+            await self.bot.send_document(chat_id, FSInputFile(path, filename=filename), caption=f"📦 {summary}")
+            await self._progress(chat_id, progress_message_id, f"✅ Eksport tayyor: <code>{filename}</code>")
+            logger.info(f"Exported {filename} to {chat_id}: {summary}")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Export {filename} failed")
+            await self._progress(chat_id, progress_message_id, "❌ Eksportda xatolik yuz berdi.")
+        finally:
+            os.remove(path)
+
+    async def _copy(self, sql: str, args: tuple, fmt: str, writer: _GzipChunkWriter):
+        if fmt == "jsonl":
+            sql = f"SELECT row_to_json(t)::text FROM ({sql}) AS t"
+            options = {"format": "csv", "delimiter": "\x02", "quote": "\x01"}
+        else:
+            options = {"format": "csv", "header": True}
+        async with self.pool.acquire() as conn:
+            await conn.copy_from_query(sql, *args, output=writer.write, timeout=LONG_TIMEOUT, **options)
+
+    async def _report(self, chat_id: int, progress_message_id: int, writer: _GzipChunkWriter):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            await self._progress(
+                chat_id, progress_message_id,
+                f"<i>⏳ Eksport: {_megabytes(writer.bytes)}, ~{writer.lines} qator...</i>"
+            )
+
+    async def _progress(self, chat_id: int, progress_message_id: int, text: str):
+        try:
+            await self.bot.edit_message_text(text, chat_id=chat_id, message_id=progress_message_id)
+        except TelegramAPIError as e:
+            logger.debug(f"Export progress update skipped: {e}")
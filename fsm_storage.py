@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 600.0
+
+
+# 💾 FSM holatlarini PostgreSQL'da saqlash
+class PostgresStorage(BaseStorage):
+    # The pool is attached in main() because the Dispatcher (and with it the
+    # storage) is created at import time, before the database is up.
+    # Reads go through a short-lived local cache that every write updates;
+    # keep cache_ttl small when updates of one chat can reach several replicas.
+    def __init__(self, ttl: float = 86400.0, cache_ttl: float = 2.0, key_builder: KeyBuilder | None = None):
+        self.pool = None
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.cache = TTLCache("fsm", maxsize=100_000, ttl=cache_ttl)
+        self._sweeper: asyncio.Task | None = None
+
+    def attach(self, pool):
+        self.pool = pool
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def close(self) -> None:
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+        # A row past its expiry counts as empty, so stale data is not revived
+        async with self.pool.acquire() as conn:
+            data = await conn.fetchval("""
+                INSERT INTO fsm_storage (key, state, expires_at)
+                VALUES ($1, $2, CURRENT_TIMESTAMP + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE
+                SET state      = EXCLUDED.state,
+                    data       = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP
+                                      THEN fsm_storage.data ELSE '{}' END,
+                    expires_at = EXCLUDED.expires_at
+                RETURNING data
+            """, storage_key, state, self.ttl)
+        self.cache.set(storage_key, (state, json.loads(data)))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        async with self.pool.acquire() as conn:
+            state = await conn.fetchval("""
+                INSERT INTO fsm_storage (key, data, expires_at)
+                VALUES ($1, $2::jsonb, CURRENT_TIMESTAMP + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE
+                SET data       = EXCLUDED.data,
+                    state      = CASE WHEN fsm_storage.expires_at > CURRENT_TIMESTAMP
+                                      THEN fsm_storage.state END,
+                    expires_at = EXCLUDED.expires_at
+                RETURNING state
+            """, storage_key, json.dumps(data), self.ttl)
+        self.cache.set(storage_key, (state, dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get(self.key_builder.build(key))
+        return dict(data)
+
+    async def _get(self, storage_key: str) -> tuple[Optional[str], Dict[str, Any]]:
+        record = self.cache.get(storage_key)
+        if record is MISSING:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow("""
+                    SELECT state, data FROM fsm_storage
+                    WHERE key = $1 AND expires_at > CURRENT_TIMESTAMP
+                """, storage_key)
+            record = (row["state"], json.loads(row["data"])) if row else (None, {})
+            self.cache.set(storage_key, record)
+        return record
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                async with self.pool.acquire() as conn:
+                    await conn.execute("DELETE FROM fsm_storage WHERE expires_at <= CURRENT_TIMESTAMP")
+            except Exception:
+                logger.exception("Failed to sweep expired FSM records")
+
+
+# 🧪 "memory" — jarayon ichidagi storage (testlar va lokal ishlab chiqish uchun)
+def build_storage(kind: str, ttl: float, cache_ttl: float) -> BaseStorage:
+    if kind == "memory":
+        return MemoryStorage()
+    if kind == "postgres":
+        return PostgresStorage(ttl=ttl, cache_ttl=cache_ttl)
+    raise ValueError(f"Unknown FSM_STORAGE: {kind}")
@@ -0,0 +1,73 @@
+from functools import lru_cache
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+# aiogram types are frozen pydantic models, so one markup instance can be
+# shared by every message that needs it.
+
+_bot_username: str | None = None
+
+
+# 🤖 Bot username'ini ishga tushishda bir marta aniqlash
+async def refresh_bot_identity(bot: Bot) -> str:
+    global _bot_username
+    me = await bot.get_me()
+    _bot_username = me.username
+    personal_link.cache_clear()
+    share_keyboard.cache_clear()
+    return _bot_username
+
+
+# 🔗 Shaxsiy havola va klaviaturalar
+@lru_cache(maxsize=50_000)
+def personal_link(token: str) -> str:
+    return f"https://t.me/{_bot_username}?start={token}"
+
+
+@lru_cache(maxsize=10_000)
+def share_keyboard(token: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📤 Ulashish", url=f"https://t.me/share/url?url={personal_link(token)}")]
+    ])
+
+
+# Both sides of a conversation get the same button; the tap tells who answers
+@lru_cache(maxsize=50_000)
+def conversation_keyboard(conversation_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="↩️ Javob berish", callback_data=f"reply:{conversation_id}")]
+    ])
+
+
+# 👨‍💻 Admin menyulari
+ADMIN_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📢 Broadcast", callback_data="admin:broadcast")],
+    [InlineKeyboardButton(text="📊 Statistika", callback_data="admin:stats")],
+    [InlineKeyboardButton(text="👥 Foydalanuvchilar", callback_data="admin:users")],
+    [InlineKeyboardButton(text="📤 Eksport", callback_data="admin:export")],
+])
+
+EXPORT_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="👥 Foydalanuvchilar · CSV", callback_data="admin:export:users:csv"),
+     InlineKeyboardButton(text="JSONL", callback_data="admin:export:users:jsonl")],
+    [InlineKeyboardButton(text="💬 Xabarlar · CSV", callback_data="admin:export:messages:csv"),
+     InlineKeyboardButton(text="JSONL", callback_data="admin:export:messages:jsonl")],
+    [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="admin:back_to_panel")],
+])
+
+USERS_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔍 Foydalanuvchini qidirish", callback_data="admin:search")],
+    [InlineKeyboardButton(text="🆕 So‘nggi 10 user", callback_data="admin:recent_users:1")],
+    [InlineKeyboardButton(text="⛔ Bloklash / Mute", callback_data="admin:punish")],
+    [InlineKeyboardButton(text="🔓 Mute’dan chiqarish", callback_data="admin:unmute")],
+    [InlineKeyboardButton(text="⬅️ Orqaga", callback_data="admin:back_to_panel")],
+])
+
+BACK_TO_PANEL = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Orqaga", callback_data="admin:back_to_panel")]
+])
+
+BACK_TO_RECENT_USERS = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Orqaga", callback_data="admin:recent_users:1")]
+])
@@ -1,23 +1,42 @@
-import asyncpg
 import asyncio
-import string
-import random
 import os
 import logging
-from datetime import datetime
+import multiprocessing
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher
-from aiogram.types import (
-    Message, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
-)
+from aiogram import Bot, Dispatcher, F, html
+from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove, ReplyParameters
 from aiogram.filters import Command, CommandObject
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramBadRequest
 from admin import is_user_admin, admin_router
+from broadcast import Broadcaster
+from cache import MISSING, token_cache, user_token_cache
+from conversations import ConversationStore, other_party
+from db import Database
+from delivery import DeliveryTracker
+from fsm_storage import PostgresStorage, build_storage
+from metrics import (
+    QUEUE_DEPTH, HandlerTimingMiddleware, TelegramMetricsMiddleware, start_metrics_server,
+)
+from message_log import MessageLogWriter, MessageLogRetention
+from migrate import run_migrations
+from mirror import LINE_TEXT_LIMIT, ChannelMirror
+from mutes import mute_registry, muted_text
+from export import Exporter
+from outbound import LANES, OutboundScheduler
+from outbox import DeliveryOutbox
+from relay import MediaRelay
+from stats import StatsAggregator
+from throttling import NEWLINK_BUSY, RECEIVER_BUSY, ThrottlingMiddleware
+from tokens import TokenService
+from users import UserRegistrar
+from webhook import ConcurrencyLimitMiddleware, run_webhook
+from keyboards import personal_link, share_keyboard, refresh_bot_identity
 
 # Load .env
 load_dotenv()
@@ -25,11 +44,81 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
 ADMIN_URL = os.getenv("ADMIN_URL")
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Pool har bir worker uchun alohida: jami ulanishlar = WEB_WORKERS * DB_POOL_MAX
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+# /newlink'dan keyin eski havola shuncha soat ishlab turadi
+TOKEN_GRACE_HOURS = float(os.getenv("TOKEN_GRACE_HOURS", "24"))
+# Ro‘yxatdan o‘tishlarni birlashtirish oynasi (soniya); 0 — har biri alohida
+REGISTRATION_BATCH_WINDOW = float(os.getenv("REGISTRATION_BATCH_WINDOW", "0"))
+# Yetkazilgan xabarga reply orqali shuncha kun javob berish mumkin
+CONVERSATION_RETENTION_DAYS = int(os.getenv("CONVERSATION_RETENTION_DAYS", "30"))
+# Anonim xabarlarni yetkazuvchi parallel workerlar va urinishlar soni
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "8"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))
+# Bot API'ga umumiy limit (Telegram: ~30 xabar/soniya) va bitta shaxsiy chatga (xabar/soniya).
+# Webhook workerlari umumiy limitni teng bo‘lishadi
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+MESSAGE_LOG_RETENTION_MONTHS = int(os.getenv("MESSAGE_LOG_RETENTION_MONTHS", "12"))
+MESSAGE_LOG_ARCHIVE_DIR = os.getenv("MESSAGE_LOG_ARCHIVE_DIR", "archive")
+# Admin eksportlari yuborilguncha shu papkada turadi; bo‘sh — tizimning vaqtinchalik papkasi
+EXPORT_DIR = os.getenv("EXPORT_DIR") or None
+# Kanal uchun alohida limit (Telegram: guruh/kanalga ~20 xabar/daqiqa)
+LOG_CHANNEL_RATE = float(os.getenv("LOG_CHANNEL_RATE", "0.3"))
+# Albom qismlarini yig‘ish oynasi (soniya)
+ALBUM_WINDOW = float(os.getenv("ALBUM_WINDOW", "0.8"))
+
+# Prometheus /metrics (faqat lokal); har bir worker o‘z portida: METRICS_PORT + index
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 — o‘chirilgan
+
+# polling (development) or webhook (production)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("PORT", os.getenv("WEB_PORT", "8080")))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "100"))
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+
+# postgres (shared between workers/replicas) or memory (tests, local runs)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres")
+FSM_TTL = float(os.getenv("FSM_TTL", "86400"))
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "2"))
+
+# Flood nazorati: oynadagi maksimal xabarlar soni / oyna uzunligi (soniya)
+FLOOD_SENDER_LIMIT = int(os.getenv("FLOOD_SENDER_LIMIT", "20"))
+FLOOD_SENDER_WINDOW = float(os.getenv("FLOOD_SENDER_WINDOW", "60"))
+FLOOD_RECEIVER_LIMIT = int(os.getenv("FLOOD_RECEIVER_LIMIT", "60"))
+FLOOD_RECEIVER_WINDOW = float(os.getenv("FLOOD_RECEIVER_WINDOW", "60"))
+FLOOD_MUTE_MINUTES = int(os.getenv("FLOOD_MUTE_MINUTES", "10"))
+# /newlink: oynada nechta marta havola yangilash mumkin / oyna uzunligi (soniya)
+NEWLINK_LIMIT = int(os.getenv("NEWLINK_LIMIT", "3"))
+NEWLINK_WINDOW = float(os.getenv("NEWLINK_WINDOW", "3600"))
 
 logging.basicConfig(level=logging.INFO)
 
 bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher()
+dp = Dispatcher(storage=build_storage(FSM_STORAGE, ttl=FSM_TTL, cache_ttl=FSM_CACHE_TTL))
+concurrency = ConcurrencyLimitMiddleware(MAX_CONCURRENT_UPDATES)
+dp.update.outer_middleware(concurrency)
+dp.message.middleware(HandlerTimingMiddleware())
+dp.callback_query.middleware(HandlerTimingMiddleware())
+# Outermost, so the Bot API latency metric leaves out the wait for a turn
+outbound = OutboundScheduler(
+    rate=OUTBOUND_RATE / (WEB_WORKERS if BOT_MODE == "webhook" else 1), chat_rate=OUTBOUND_CHAT_RATE
+)
+bot.session.middleware(outbound)
+bot.session.middleware(TelegramMetricsMiddleware())
+relay = MediaRelay(bot, album_window=ALBUM_WINDOW)
 
 
 # 📘 FSM holatlari
@@ -37,76 +126,67 @@ class QuestionStates(StatesGroup):
     waiting_for_question = State()
 
 
-# 🔐 Token generatsiyasi
-def generate_token(length=8):
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+throttling = ThrottlingMiddleware(
+    question_state=QuestionStates.waiting_for_question.state,
+    sender_limit=FLOOD_SENDER_LIMIT,
+    sender_window=FLOOD_SENDER_WINDOW,
+    receiver_limit=FLOOD_RECEIVER_LIMIT,
+    receiver_window=FLOOD_RECEIVER_WINDOW,
+    mute_minutes=FLOOD_MUTE_MINUTES,
+    newlink_limit=NEWLINK_LIMIT,
+    newlink_window=NEWLINK_WINDOW
+)
+dp.message.outer_middleware(throttling)
 
 
 # 🔌 PostgreSQL connection pool yaratish
 async def init_db():
-    pool = await asyncpg.create_pool(DATABASE_URL)
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                username TEXT,
-                name TEXT,
-                token TEXT UNIQUE,
-                is_admin BOOLEAN DEFAULT FALSE,
-                is_superuser BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS muted_users(
-    user_id     BIGINT PRIMARY KEY REFERENCES users (user_id) ON DELETE CASCADE,
-    muted_until TIMESTAMP NOT NULL,
-    reason      TEXT,
-    created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        await conn.execute("""
-                        CREATE TABLE IF NOT EXISTS message_log(
-    id          SERIAL PRIMARY KEY,
-    sender_id   BIGINT,
-    receiver_id BIGINT,
-    message     TEXT,
-    sent_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-    return pool
+    db = Database(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        acquire_timeout=DB_ACQUIRE_TIMEOUT,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE
+    )
+    await db.connect()
+    await run_migrations(db)
+    return db
 
 
 # 🔍 Token orqali foydalanuvchini topish
 async def get_user_by_token(pool, token: str):
-    async with pool.acquire() as conn:
-        return await conn.fetchrow("SELECT user_id FROM users WHERE token = $1", token)
-
-
-# 🚫 Mute tekshirish
-async def is_user_muted(pool, user_id: int) -> tuple[bool, datetime | None]:
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT muted_until FROM muted_users WHERE user_id = $1", user_id)
-        if row:
-            muted_until = row["muted_until"]
-            current_time = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
-            if muted_until > current_time:
-                return True, muted_until
-            else:
-                await conn.execute("DELETE FROM muted_users WHERE user_id = $1", user_id)
-        return False, None
-
-
-# 📝 Xabar log qilish
-async def log_message(pool, sender_id, receiver_id, text):
+    user = token_cache.get(token)
+    if user is MISSING:
+        now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+        user = await pool.row("user_by_token", token, now)
+        token_cache.set(token, user)
+    return user
+
+
+# 👤 Foydalanuvchi tokeni: keshdan yoki bitta upsert orqali (yangi bo‘lsa ro‘yxatdan o‘tadi)
+async def get_user_token(user_id: int, username: str | None, name: str) -> str:
+    token = user_token_cache.get(user_id)
+    if token is MISSING:
+        tashkent_time = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+        token, created = await dp["users"].register(user_id, username, name, tashkent_time)
+        if created:
+            dp["stats"].user_created(tashkent_time.date())
+        token_cache.set(token, {"user_id": user_id})
+        user_token_cache.set(user_id, token)
+    return token
+
+
+# 🚫 Mute tekshirish (xotiradagi reyestrdan, bazaga murojaatsiz)
+def is_user_muted(user_id: int) -> tuple[bool, datetime | None]:
+    muted_until = mute_registry.muted_until(user_id)
+    return muted_until is not None, muted_until
+
+
+# 📝 Xabar log qilish (fon rejimidagi yozuvchi navbatiga)
+async def log_message(writer, sender_id, receiver_id, text, content_type="text"):
     tashkent_time = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
-    async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO message_log (sender_id, receiver_id, message, sent_at)
-            VALUES ($1, $2, $3, $4)
-        """, sender_id, receiver_id, text, tashkent_time)
+    await writer.put(sender_id, receiver_id, text, content_type, tashkent_time)
 
 
 # 🚀 /start komandasi
@@ -117,132 +197,183 @@ async def start_handler(message: Message, command: CommandObject, state: FSMCont
     username = message.from_user.username
     name = message.from_user.full_name
 
+    # Foydalanuvchi botga yozdi — demak chat yana tirik
+    dp["delivery"].delivered(user_id)
+
     if command.args:
-        is_muted, muted_until = await is_user_muted(pool, user_id)
+        is_muted, muted_until = is_user_muted(user_id)
         if is_muted:
-            vaqt_str = muted_until.strftime("%Y-%m-%d %H:%M:%S")
-            await message.answer(
-                f"⛔ Siz vaqtinchalik xabar yubora olmaysiz.\n"
-                f"🕒 Mute Toshkent vaqti bilan {vaqt_str} gacha davom etadi.\n"
-                f"Iltimos, kuting."
-            )
+            await message.answer(muted_text(muted_until))
             return
 
         target = await get_user_by_token(pool, command.args)
         if target:
             await state.set_state(QuestionStates.waiting_for_question)
-            await state.update_data(target_id=target["user_id"])
+            # A fresh link starts from scratch, even mid-reply
+            await state.set_data({"target_id": target["user_id"]})
             await message.answer("<b>Murojaatingizni shu yerga yozing!</b>")
         else:
             await message.answer("<b>⚠️ Noto‘g‘ri havola.</b>")
     else:
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT token FROM users WHERE user_id = $1", user_id)
-            if row:
-                token = row["token"]
-            else:
-                token = generate_token()
-                tashkent_time = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
-                await conn.execute(
-                    "INSERT INTO users (user_id, username, name, token, created_at) VALUES ($1, $2, $3, $4, $5)",
-                    user_id, username, name, token, tashkent_time
-                )
-
-        bot_username = (await bot.me()).username
-        link = f"https://t.me/{bot_username}?start={token}"
-        share_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📤 Ulashish", url=f"https://t.me/share/url?url={link}")]
-        ])
+        token = await get_user_token(user_id, username, name)
 
         await message.answer(
             f"<b>👋 Xush kelibsiz, {name}!\n</b>"
             f"<b>Bu sizning shaxsiy havolangiz:\n</b>"
-            f"\n🔗 {link}\n\n"
+            f"\n🔗 {personal_link(token)}\n\n"
             f"<b>Ulashish orqali anonim suhbat quring!</b>",
-            reply_markup=share_keyboard
+            reply_markup=share_keyboard(token)
         )
 
 
-@dp.message(QuestionStates.waiting_for_question)
-async def handle_question(message: Message, state: FSMContext):
-    pool = dp["db"]
-    data = await state.get_data()
-    target_id = data.get("target_id")
-
-    user_id = message.from_user.id
-    username = message.from_user.username
-    name = message.from_user.full_name
-
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT token FROM users WHERE user_id = $1", user_id)
-        if row:
-            sender_token = row["token"]
-        else:
-            sender_token = generate_token()
-            tashkent_time = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
-            await conn.execute(
-                "INSERT INTO users (user_id, username, name, token, created_at) VALUES ($1, $2, $3, $4, $5)",
-                user_id, username, name, sender_token, tashkent_time
-            )
-
-    bot_username = (await bot.me()).username
-    link = f"https://t.me/{bot_username}?start={sender_token}"
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="↩️ Javob berish", url=link)]
-    ])
+# 🗂 Yuborilgan xabarni bazaga yozish va kanalga nusxalash
+async def record_relay(parts: list[Message], user_id: int, name: str, target_id: int):
+    for part in parts:
+        await log_message(dp["message_log"], user_id, target_id, part.text or part.caption, part.content_type)
 
+    first = parts[0]
+    if first.text:
+        dp["mirror"].submit_text(
+            f'📥 <a href="tg://user?id={user_id}">{html.quote(name)}</a> → '
+            f'👤 <a href="tg://user?id={target_id}">{target_id}</a>\n{html.quote(first.text[:LINE_TEXT_LIMIT])}'
+        )
+        return
+
+    sender_link = f'<a href="tg://user?id={user_id}">{html.quote(name)}</a>'
+    receiver_link = f'<a href="tg://user?id={target_id}">{target_id}</a>'
+    log_caption = (
+        f"📥 <b>Yuboruvchi:</b> {sender_link}\n\n"
+        f"👤 <b>Qabul qiluvchi:</b> {receiver_link}"
+    )
+    # Kanalga nusxa fon rejimida ketadi, yuboruvchi kutmaydi
+    if len(parts) > 1:
+        dp["mirror"].submit_album(first.chat.id, [part.message_id for part in parts], log_caption)
+    else:
+        dp["mirror"].submit_media(first.chat.id, first.message_id, log_caption)
+
+
+# ✉️ Anonim xabarni navbatga qo‘yish: havola orqali ham, javob orqali ham
+# Returns False when nothing was queued yet and the reply state should
+# stay: an unsupported message or an album part that joined a buffered album
+async def send_anonymous(message: Message, target_id: int, conversation_id: int) -> bool:
+    if not relay.supports(message):
+        await message.answer("<b>⚠️ Ushbu turdagi xabar qo‘llab-quvvatlanmaydi.</b>")
+        return False
+
+    parts = await relay.collect(message, (target_id, conversation_id))
+    if not parts:
+        # Albomning qolgan qismlari birinchi qism bilan birga yuboriladi
+        return False
+    # Delivery happens in the outbox workers; the sender hears back only
+    # if it finally fails
+    await dp["outbox"].enqueue(parts, target_id, conversation_id)
+    await message.answer("✅ Xabaringiz qabul qilindi va yuborilmoqda!", reply_markup=ReplyKeyboardRemove())
+    return True
+
+
+# 📬 Outbox natijalari
+async def outbox_sent(row, parts: list[Message], sent_ids: list[int]):
+    # Every copy in the receiver's chat can be answered with a native reply
+    dp["conversations"].remember(row["conversation_id"], row["target_id"], sent_ids)
+    await record_relay(parts, row["sender_id"], parts[0].from_user.full_name, row["target_id"])
+    dp["delivery"].delivered(row["target_id"])
+
+
+async def outbox_dead(row, parts: list[Message], error: Exception):
+    if isinstance(error, TelegramForbiddenError):
+        dp["delivery"].failed(row["target_id"], type(error).__name__)
+        text = "❌ Xabar yetkazilmadi. Foydalanuvchi botni bloklagan."
+    elif isinstance(error, TelegramBadRequest):
+        text = f"⚠️ Xabar yetkazilmadi: {html.quote(error.message)}"
+    else:
+        text = "❌ Xabar yetkazilmadi. Birozdan so‘ng qayta urinib ko‘ring."
     try:
-        if message.text:
-            await bot.send_message(
-                chat_id=target_id,
-                text=f"<b>📨 Sizga yangi anonim xabar bor!</b>\n\n{message.text}",
-                reply_markup=keyboard
-            )
-            await log_message(pool, user_id, target_id, message.text)
+        await bot.send_message(row["sender_id"], text, reply_parameters=ReplyParameters(
+            message_id=parts[0].message_id, allow_sending_without_reply=True
+        ))
+    except TelegramAPIError as e:
+        logging.warning(f"Could not tell {row['sender_id']} about a failed delivery: {e}")
+
+
+# 💬 Yetkazilgan xabarga Telegram'ning o‘z reply'i: to‘g‘ridan-to‘g‘ri suhbatdagi ikkinchi tomonga
+async def threaded_reply(message: Message) -> bool | dict:
+    reply = message.reply_to_message
+    if reply is None or reply.from_user is None or reply.from_user.id != bot.id:
+        return False
+    # Commands stay commands; late album parts have their own handler
+    if (message.text or "").startswith("/") or relay.is_late_part(message.media_group_id):
+        return False
+    conversation = await dp["conversations"].by_message(message.chat.id, reply.message_id)
+    target_id = other_party(conversation, message.from_user.id) if conversation else None
+    if target_id is None:
+        return False
+    return {"conversation_id": conversation["id"], "target_id": target_id}
+
+
+@dp.message(threaded_reply)
+async def handle_reply(message: Message, conversation_id: int, target_id: int):
+    # Like the flood limits, checked once per album
+    if not relay.joins_album(message.media_group_id):
+        is_muted, muted_until = is_user_muted(message.from_user.id)
+        if is_muted:
+            await message.answer(muted_text(muted_until))
+            return
+        if not throttling.allow_receiver(target_id):
+            await message.answer(RECEIVER_BUSY)
+            return
+    await send_anonymous(message, target_id, conversation_id)
+
+
+# ↩️ "Javob berish" tugmasi: /start va havolasiz, shu suhbatning o‘zida
+@dp.callback_query(F.data.startswith("reply:"))
+async def start_reply(callback: CallbackQuery, state: FSMContext):
+    # Callback data comes from the client, so a forged id is not found either
+    _, _, conversation_id = callback.data.partition(":")
+    valid = conversation_id.isascii() and conversation_id.isdigit() and int(conversation_id) < 2 ** 63
+    conversation = await dp["conversations"].get(int(conversation_id)) if valid else None
+    target_id = other_party(conversation, callback.from_user.id) if conversation else None
+    if target_id is None:
+        await callback.answer("⚠️ Bu suhbat topilmadi.", show_alert=True)
+        return
+
+    is_muted, muted_until = is_user_muted(callback.from_user.id)
+    if is_muted:
+        await callback.answer(muted_text(muted_until), show_alert=True)
+        return
+
+    await state.set_state(QuestionStates.waiting_for_question)
+    await state.set_data({"target_id": target_id, "conversation_id": conversation["id"]})
+    await callback.message.answer(
+        "<b>Javobingizni shu yerga yozing!</b>\n"
+        "<i>Keyingi safar xabarga shunchaki reply qilsangiz ham bo‘ladi.</i>"
+    )
+    await callback.answer()
 
-        else:
-            if message.photo:
-                await bot.send_photo(target_id, message.photo[-1].file_id,
-                                     caption="<b>📨 Sizga yangi anonim xabar bor!</b>", reply_markup=keyboard)
-            elif message.video:
-                await bot.send_video(target_id, message.video.file_id, caption="<b>📨 Sizga yangi anonim xabar bor!</b>",
-                                     reply_markup=keyboard)
-            elif message.voice:
-                await bot.send_voice(target_id, message.voice.file_id, caption="<b>📨 Sizga yangi anonim xabar bor!</b>",
-                                     reply_markup=keyboard)
-            elif message.document:
-                await bot.send_document(target_id, message.document.file_id,
-                                        caption="<b>📨 Sizga yangi anonim xabar bor!</b>", reply_markup=keyboard)
-            else:
-                await message.answer("<b>⚠️ Ushbu turdagi xabar qo‘llab-quvvatlanmaydi.</b>")
-                return
-
-            sender_link = f'<a href="tg://user?id={user_id}">{name}</a>'
-            receiver_link = f'<a href="tg://user?id={target_id}">{target_id}</a>'
-
-            log_caption = (
-                f"📥 <b>Yuboruvchi:</b> {sender_link}\n\n"
-                f"👤 <b>Qabul qiluvchi:</b> {receiver_link}"
-            )
 
-            if message.photo:
-                await bot.send_photo(LOG_CHANNEL_ID, message.photo[-1].file_id, caption=log_caption, parse_mode='HTML')
-            elif message.video:
-                await bot.send_video(LOG_CHANNEL_ID, message.video.file_id, caption=log_caption, parse_mode='HTML')
-            elif message.voice:
-                await bot.send_voice(LOG_CHANNEL_ID, message.voice.file_id, caption=log_caption, parse_mode='HTML')
-            elif message.document:
-                await bot.send_document(LOG_CHANNEL_ID, message.document.file_id, caption=log_caption,
-                                        parse_mode='HTML')
+@dp.message(QuestionStates.waiting_for_question)
+async def handle_question(message: Message, state: FSMContext):
+    data = await state.get_data()
+    target_id = data.get("target_id")
+    conversation_id = data.get("conversation_id")
+    if conversation_id is None:
+        # First message through a link: the sender has to be registered
+        # before a conversation can point at them
+        user_id = message.from_user.id
+        await get_user_token(user_id, message.from_user.username, message.from_user.full_name)
+        conversation_id = await dp["conversations"].open(user_id, target_id)
 
-        await message.answer("✅ Xabaringiz yuborildi!", reply_markup=ReplyKeyboardRemove())
+    if await send_anonymous(message, target_id, conversation_id):
+        await state.clear()
 
-    except TelegramForbiddenError:
-        await message.answer("❌ Xabar yuborilmadi. Foydalanuvchi botni bloklagan.")
-    except TelegramBadRequest as e:
-        await message.answer(f"⚠️ Xatolik yuz berdi: {e.message}")
 
-    await state.clear()
+# 🧩 Albom yuborilgandan keyin kelib qolgan qismlar
+@dp.message(F.media_group_id.func(relay.is_late_part))
+async def handle_album_tail(message: Message):
+    route = relay.late_route(message.media_group_id)
+    if route is None:
+        return
+    target_id, conversation_id = route
+    await dp["outbox"].enqueue([message], target_id, conversation_id)
 
 
 @dp.message(Command("help"))
@@ -262,20 +393,158 @@ async def send_help(message: Message, bot: Bot, dispatcher: Dispatcher):
             "<b>❓ Yordam</b>\n\n"
             "Quyidagi komandalar mavjud:\n"
             "• /start — botni ishga tushurish\n"
-            "• /help — yordam oynasi\n\n"
+            "• /help — yordam oynasi\n"
+            "• /newlink — yangi havola olish\n\n"
             f"Agar sizga qo‘shimcha yordam kerak bo‘lsa, <a href='{ADMIN_URL}'>admin</a> bilan bog‘laning."
         )
 
 
-async def main():
-    pool = await init_db()
-    dp["db"] = pool
+# 🔄 /newlink — havolani almashtirish (eskisi grace davomida ishlaydi)
+@dp.message(Command("newlink"))
+async def new_link(message: Message):
+    user_id = message.from_user.id
+    if not throttling.allow_newlink(user_id):
+        await message.answer(NEWLINK_BUSY)
+        return
+    rotated = await dp["tokens"].rotate(user_id)
+    if rotated is None:
+        await message.answer("⚠️ Avval /start buyrug‘ini yuboring.")
+        return
+
+    old_token, token = rotated
+    # The old link is an alias now and stops working when it expires, so it
+    # is looked up again instead of answering from the cache
+    if old_token is not None:
+        token_cache.invalidate(old_token)
+    user_token_cache.set(user_id, token)
+    token_cache.set(token, {"user_id": user_id})
+    await message.answer(
+        f"<b>🔄 Yangi shaxsiy havolangiz:</b>\n"
+        f"\n🔗 {personal_link(token)}\n\n"
+        f"<i>Eski havola yana {TOKEN_GRACE_HOURS:g} soat ishlaydi.</i>",
+        reply_markup=share_keyboard(token)
+    )
+
+
+# ⚙️ Fon xizmatlarini yaratish va ishga tushirish (main va bench uchun umumiy)
+async def start_services(db):
+    dp["db"] = db
+    dp["throttling"] = throttling
+    if isinstance(dp.storage, PostgresStorage):
+        dp.storage.attach(db)
+    await mute_registry.load(db)
+    await throttling.attach(db)
+    await refresh_bot_identity(bot)
+    delivery = DeliveryTracker(db)
+    dp["delivery"] = delivery
+    stats = StatsAggregator(db)
+    dp["stats"] = stats
+    message_log = MessageLogWriter(db, stats=stats)
+    dp["message_log"] = message_log
+    dp["retention"] = MessageLogRetention(
+        db, retention_months=MESSAGE_LOG_RETENTION_MONTHS, archive_dir=MESSAGE_LOG_ARCHIVE_DIR
+    )
+    mirror = ChannelMirror(bot, db, LOG_CHANNEL_ID, rate=LOG_CHANNEL_RATE)
+    dp["mirror"] = mirror
+    dp["broadcaster"] = Broadcaster(bot, db, rate=BROADCAST_RATE)
+    dp["exporter"] = Exporter(bot, db, export_dir=EXPORT_DIR)
+    tokens = TokenService(db, grace=timedelta(hours=TOKEN_GRACE_HOURS))
+    dp["tokens"] = tokens
+    dp["users"] = UserRegistrar(db, tokens, batch_window=REGISTRATION_BATCH_WINDOW)
+    conversations = ConversationStore(db, retention_days=CONVERSATION_RETENTION_DAYS)
+    dp["conversations"] = conversations
+    outbox = DeliveryOutbox(
+        db, relay, on_sent=outbox_sent, on_dead=outbox_dead,
+        workers=OUTBOX_WORKERS, max_attempts=OUTBOX_MAX_ATTEMPTS
+    )
+    dp["outbox"] = outbox
     dp.include_router(admin_router)
+
+    QUEUE_DEPTH.track("updates_in_flight", callback=lambda: concurrency.in_flight)
+    QUEUE_DEPTH.track("message_log", callback=lambda: message_log.depth)
+    QUEUE_DEPTH.track("mirror", callback=lambda: mirror.depth)
+    QUEUE_DEPTH.track("delivery_results", callback=lambda: delivery.pending)
+    QUEUE_DEPTH.track("open_albums", callback=lambda: relay.open_albums)
+    QUEUE_DEPTH.track("conversation_messages", callback=lambda: conversations.pending)
+    QUEUE_DEPTH.track("outbox_in_flight", callback=lambda: outbox.in_flight)
+    for lane in LANES:
+        QUEUE_DEPTH.track(f"outbound_{lane}", callback=lambda lane=lane: outbound.depth(lane))
+
+    outbound.start()
+    db.start()
+    tokens.start()
+    delivery.start()
+    conversations.start()
+    outbox.start()
+    stats.start()
+    message_log.start()
+    dp["retention"].start()
+    mirror.start()
+    dp["broadcaster"].start()
+
+
+async def stop_services():
+    await dp["broadcaster"].stop()
+    await dp["exporter"].stop()
+    await dp["outbox"].stop()
+    await dp["users"].close()
+    await dp["tokens"].stop()
+    await dp["mirror"].close()
+    await dp["retention"].stop()
+    await throttling.close()
+    await mute_registry.close()
+    await dp["conversations"].stop()
+    await dp["message_log"].close()
+    await dp["stats"].stop()
+    await dp["delivery"].stop()
+    await dp.storage.close()
+    await dp["db"].close()
+    await outbound.stop()
+
+
+async def main(worker_index: int = 0):
+    db = await init_db()
+    await start_services(db)
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + worker_index, health=db.check)
     try:
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(
+                dp, bot,
+                url=WEBHOOK_URL,
+                path=WEBHOOK_PATH,
+                secret=WEBHOOK_SECRET,
+                host=WEB_HOST,
+                port=WEB_PORT,
+                worker_index=worker_index,
+                max_connections=MAX_CONCURRENT_UPDATES
+            )
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
-        await pool.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await stop_services()
+
+
+def run_worker(worker_index: int):
+    asyncio.run(main(worker_index))
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Webhook mode can fan out to several processes sharing one port
+    workers = WEB_WORKERS if BOT_MODE == "webhook" else 1
+    processes = [
+        multiprocessing.get_context("spawn").Process(target=run_worker, args=(index,), daemon=True)
+        for index in range(1, workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        run_worker(0)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
@@ -0,0 +1,255 @@
+import asyncio
+import gzip
+import logging
+import os
+import time
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from db import LONG_TIMEOUT
+from metrics import MESSAGE_LOG_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("sender_id", "receiver_id", "message", "content_type", "sent_at")
+FLUSH_RETRIES = 3
+RETENTION_LOCK_KEY = 7_061_110_002
+
+
+# 📝 message_log uchun navbatli, COPY orqali yozuvchi
+class MessageLogWriter:
+    def __init__(self, pool, max_queue: int = 10_000, batch_size: int = 500, flush_interval: float = 1.0,
+                 stats=None):
+        self.pool = pool
+        self.stats_aggregator = stats
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: asyncio.Task | None = None
+        self.flushed = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, sender_id: int, receiver_id: int, text: str | None, content_type: str = "text",
+                  sent_at: datetime | None = None):
+        if sent_at is None:
+            sent_at = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+        # A full queue makes producers wait here instead of growing without bound
+        await self._queue.put((sender_id, receiver_id, text, content_type, sent_at))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        # The sentinel lands behind everything already queued, so the
+        # writer drains the backlog before it exits
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "last_flush_latency": self.last_flush_latency,
+            "avg_flush_latency": self.total_flush_latency / self.flushes if self.flushes else 0.0,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                break
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        started = time.monotonic()
+        for attempt in range(1, FLUSH_RETRIES + 1):
+            try:
+                async with self.pool.acquire() as conn:
+                    await conn.copy_records_to_table("message_log", records=batch, columns=COLUMNS)
+                break
+            except Exception:
+                logger.exception(f"message_log flush failed (attempt {attempt}/{FLUSH_RETRIES})")
+                if attempt == FLUSH_RETRIES:
+                    self.dropped += len(batch)
+                    MESSAGE_LOG_FLUSH_SECONDS.observe("dropped", value=time.monotonic() - started)
+                    return
+                await asyncio.sleep(attempt)
+
+        self.last_flush_latency = time.monotonic() - started
+        MESSAGE_LOG_FLUSH_SECONDS.observe("written", value=self.last_flush_latency)
+        self.total_flush_latency += self.last_flush_latency
+        self.flushes += 1
+        self.flushed += len(batch)
+
+        if self.stats_aggregator is not None:
+            for sender_id, _, _, content_type, sent_at in batch:
+                self.stats_aggregator.message_logged(sender_id, content_type, sent_at.date())
+
+
+# 🗂 Oylik bo‘limlar (partition) va arxivlash
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def _add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"message_log_y{month:%Y}m{month:%m}"
+
+
+# Run only under RETENTION_LOCK_KEY: two sessions creating the same
+# partition at once make one of them fail
+async def ensure_partitions(conn, start: date, months: int):
+    month = _month_start(start)
+    for _ in range(months):
+        upper = _add_months(month, 1)
+        if await conn.fetchval("SELECT to_regclass($1)", partition_name(month)) is None:
+            await _create_partition(conn, month, upper)
+        month = upper
+
+
+async def _create_partition(conn, month: date, upper: date):
+    name = partition_name(month)
+    bounds = f"FROM ('{month}') TO ('{upper}')"
+    async with conn.transaction():
+        # Rows written while the month had no partition sit in the default
+        # one, and Postgres will not create a partition over them; they
+        # are moved into a plain table that is then attached
+        stray = await conn.fetchval(f"""
+            SELECT EXISTS (SELECT 1 FROM message_log_default WHERE sent_at >= '{month}' AND sent_at < '{upper}')
+        """)
+        if not stray:
+            await conn.execute(f"CREATE TABLE {name} PARTITION OF message_log FOR VALUES {bounds}")
+            return
+        await conn.execute(f"CREATE TABLE {name} (LIKE message_log)")
+        moved = await conn.execute(f"""
+            WITH moved AS (
+                DELETE FROM message_log_default
+                WHERE sent_at >= '{month}' AND sent_at < '{upper}'
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, timeout=LONG_TIMEOUT)
+        await conn.execute(f"ALTER TABLE message_log ATTACH PARTITION {name} FOR VALUES {bounds}", timeout=LONG_TIMEOUT)
+    logger.info(f"Created {name} and moved {moved.split()[-1]} rows into it from message_log_default")
+
+
+class MessageLogRetention:
+    def __init__(self, pool, retention_months: int = 12, archive_dir: str = "archive",
+                 months_ahead: int = 2, interval: float = 6 * 3600):
+        self.pool = pool
+        self.retention_months = retention_months
+        self.archive_dir = archive_dir
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("message_log retention run failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        # Every worker and replica runs this job; the lock lets one of them do it
+        async with self.pool.acquire() as lock_conn:
+            if not await lock_conn.fetchval("SELECT pg_try_advisory_lock($1)", RETENTION_LOCK_KEY):
+                return
+            try:
+                await self._run_retention()
+            finally:
+                await lock_conn.execute("SELECT pg_advisory_unlock($1)", RETENTION_LOCK_KEY)
+
+    async def _run_retention(self):
+        today = datetime.now(ZoneInfo("Asia/Tashkent")).date()
+        cutoff = _add_months(_month_start(today), -self.retention_months)
+
+        async with self.pool.acquire() as conn:
+            # Partitions are created ahead of time so rows never pile up in
+            # the default partition
+            await ensure_partitions(conn, today, self.months_ahead + 1)
+            attached = await conn.fetch("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'message_log'::regclass
+                  AND c.relname ~ '^message_log_y[0-9]{4}m[0-9]{2}$'
+            """)
+            for row in attached:
+                if row["relname"] < partition_name(cutoff):
+                    await conn.execute(
+                        f"ALTER TABLE message_log DETACH PARTITION {row['relname']}", timeout=LONG_TIMEOUT
+                    )
+                    logger.info(f"Detached {row['relname']}")
+
+            # Detached but not yet archived, including leftovers of an interrupted run
+            expired = await conn.fetch("""
+                SELECT c.relname
+                FROM pg_class c
+                WHERE c.relkind = 'r'
+                  AND c.relname ~ '^message_log_y[0-9]{4}m[0-9]{2}$'
+                  AND c.relnamespace = 'public'::regnamespace
+                  AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+                ORDER BY c.relname
+            """)
+
+        for row in expired:
+            await self._archive(row["relname"])
+
+    async def _archive(self, table: str):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{table}.csv.gz")
+        tmp_path = path + ".tmp"
+
+        async with self.pool.acquire() as conn:
+            with gzip.open(tmp_path, "wb") as output:
+                await conn.copy_from_table(table, output=output, format="csv", header=True, timeout=LONG_TIMEOUT)
+            os.replace(tmp_path, path)
+            await conn.execute(f"DROP TABLE {table}")
+        logger.info(f"Archived {table} to {path}")
@@ -0,0 +1,209 @@
+import logging
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+logger = logging.getLogger(__name__)
+
+INF_BUCKET = 'le="+Inf"'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# 📏 Prometheus text formatidagi oddiy metrikalar
+# prometheus_client is not a dependency; these cover the three types we use
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    # A gauge either holds values set from outside or reads them from
+    # callbacks at scrape time, which suits queue depths
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+        self._callbacks: dict[tuple, object] = {}
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+    def track(self, *labels, callback):
+        self._callbacks[labels] = callback
+
+    def samples(self) -> list[str]:
+        values = dict(self._values)
+        for labels, callback in self._callbacks.items():
+            try:
+                values[labels] = callback()
+            except Exception:
+                logger.exception(f"Gauge callback for {self.name} failed")
+        return [
+            f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., count, sum]
+
+    def observe(self, *labels, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, INF_BUCKET)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-1])}")
+        return lines
+
+
+REGISTRY: list[Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Time spent in update handlers", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised, by exception class", ("handler", "error"))
+DB_QUERY_SECONDS = Histogram("bot_db_query_seconds", "asyncpg query time by statement type", ("statement",))
+DB_QUERY_ERRORS = Counter("bot_db_query_errors_total", "Failed asyncpg queries by exception class", ("error",))
+DB_ACQUIRE_SECONDS = Histogram("bot_db_pool_acquire_seconds", "Time spent waiting for a pool connection")
+TELEGRAM_SECONDS = Histogram("bot_telegram_request_seconds", "Bot API call latency", ("method",))
+TELEGRAM_ERRORS = Counter("bot_telegram_errors_total", "Failed Bot API calls by exception class", ("method", "error"))
+QUEUE_DEPTH = Gauge("bot_queue_depth", "Items waiting in in-process queues and buffers", ("queue",))
+MESSAGE_LOG_FLUSH_SECONDS = Histogram(
+    "bot_message_log_flush_seconds", "message_log batch write time, retries included", ("result",)
+)
+
+
+# ⏱ Handlerlar vaqtini o‘lchash (inner middleware: faqat filtrdan o‘tganlar)
+class HandlerTimingMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(name, value=time.perf_counter() - started)
+
+
+# 📡 Bot API so‘rovlari: kechikish va xatolar
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(name, value=time.perf_counter() - started)
+
+
+# 🗄 asyncpg: so‘rov vaqti (query logger)
+def _log_query(record):
+    # Label by the leading keyword only; full SQL would explode the series
+    statement = record.query.lstrip().split(None, 1)[0].upper() if record.query.strip() else "EMPTY"
+    DB_QUERY_SECONDS.observe(statement, value=record.elapsed)
+    if record.exception is not None:
+        DB_QUERY_ERRORS.inc(type(record.exception).__name__)
+
+
+async def instrument_connection(conn):
+    conn.add_query_logger(_log_query)
+
+
+# 🌐 Mahalliy /metrics endpoint
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int, health=None) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    if health is not None:
+        # health is an async callable returning a dict with an "ok" key
+        async def health_handler(request: web.Request) -> web.Response:
+            result = await health()
+            return web.json_response(result, status=200 if result["ok"] else 503)
+
+        app.router.add_get("/healthz", health_handler)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Metrics served on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,58 @@
+import logging
+import os
+import re
+
+from db import LONG_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Any constant works as long as every replica uses the same one
+ADVISORY_LOCK_KEY = 7_061_110_001
+FILENAME_RE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> list[tuple[int, str, str]]:
+    migrations = []
+    for filename in os.listdir(directory):
+        match = FILENAME_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+# 🧱 Migratsiyalarni ishga tushirish
+async def run_migrations(pool, directory: str = MIGRATIONS_DIR):
+    migrations = discover_migrations(directory)
+    async with pool.acquire() as conn:
+        # Replicas starting together queue up here; the first one applies
+        # the pending files and the rest find nothing left to do
+        await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_KEY, timeout=LONG_TIMEOUT)
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations(
+    version    INTEGER PRIMARY KEY,
+    name       TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+
+            for version, name, path in migrations:
+                if version in applied:
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    sql = f.read()
+                async with conn.transaction():
+                    await conn.execute(sql, timeout=LONG_TIMEOUT)
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name
+                    )
+                logger.info(f"Applied migration {version:04d}_{name}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
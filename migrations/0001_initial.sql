@@ -0,0 +1,16 @@
+CREATE TABLE IF NOT EXISTS users (
+    user_id      BIGINT PRIMARY KEY,
+    username     TEXT,
+    name         TEXT,
+    token        TEXT UNIQUE,
+    is_admin     BOOLEAN DEFAULT FALSE,
+    is_superuser BOOLEAN DEFAULT FALSE,
+    created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS muted_users (
+    user_id     BIGINT PRIMARY KEY REFERENCES users (user_id) ON DELETE CASCADE,
+    muted_until TIMESTAMP NOT NULL,
+    reason      TEXT,
+    created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,53 @@
+-- message_log is RANGE-partitioned by month on sent_at. A pre-partitioning
+-- SERIAL table is renamed, copied into monthly partitions and dropped.
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('message_log')) = 'r' THEN
+        ALTER TABLE message_log RENAME TO message_log_legacy;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS message_log (
+    id          BIGINT GENERATED ALWAYS AS IDENTITY,
+    sender_id   BIGINT,
+    receiver_id BIGINT,
+    message     TEXT,
+    sent_at     TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, sent_at)
+) PARTITION BY RANGE (sent_at);
+
+CREATE TABLE IF NOT EXISTS message_log_default PARTITION OF message_log DEFAULT;
+CREATE INDEX IF NOT EXISTS message_log_sender_idx ON message_log (sender_id, sent_at);
+CREATE INDEX IF NOT EXISTS message_log_receiver_idx ON message_log (receiver_id, sent_at);
+
+DO $$
+DECLARE
+    month      DATE;
+    last_month DATE;
+BEGIN
+    IF to_regclass('message_log_legacy') IS NULL THEN
+        RETURN;
+    END IF;
+
+    SELECT date_trunc('month', MIN(sent_at))::date, date_trunc('month', MAX(sent_at))::date
+    INTO month, last_month
+    FROM message_log_legacy;
+
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF message_log FOR VALUES FROM (%L) TO (%L)',
+            'message_log_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+            month, (month + INTERVAL '1 month')::date
+        );
+        month := (month + INTERVAL '1 month')::date;
+    END LOOP;
+
+    INSERT INTO message_log (id, sender_id, receiver_id, message, sent_at)
+    OVERRIDING SYSTEM VALUE
+    SELECT id, sender_id, receiver_id, message, COALESCE(sent_at, CURRENT_TIMESTAMP)
+    FROM message_log_legacy;
+
+    PERFORM setval(pg_get_serial_sequence('message_log', 'id'), GREATEST(MAX(id), 1)) FROM message_log;
+
+    DROP TABLE message_log_legacy;
+END $$;
@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id                  BIGSERIAL PRIMARY KEY,
+    admin_chat_id       BIGINT NOT NULL,
+    from_chat_id        BIGINT NOT NULL,
+    message_id          BIGINT NOT NULL,
+    progress_message_id BIGINT,
+    status              TEXT NOT NULL DEFAULT 'pending',
+    last_user_id        BIGINT NOT NULL DEFAULT 0,
+    total               INTEGER NOT NULL DEFAULT 0,
+    sent                INTEGER NOT NULL DEFAULT 0,
+    failed              INTEGER NOT NULL DEFAULT 0,
+    locked_by           TEXT,
+    heartbeat_at        TIMESTAMP,
+    created_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at         TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_id BIGINT REFERENCES broadcasts (id) ON DELETE CASCADE,
+    user_id      BIGINT,
+    error        TEXT,
+    delivered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (broadcast_id, user_id)
+);
@@ -0,0 +1,6 @@
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS blocked_at    TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS failure_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS last_error    TEXT;
+
+CREATE INDEX IF NOT EXISTS users_reachable_idx ON users (user_id) WHERE blocked_at IS NULL;
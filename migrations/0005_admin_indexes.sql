@@ -0,0 +1,3 @@
+-- show_statistics counts users by created_at, show_recent_users pages by
+-- created_at DESC; user_id breaks ties between rows created in the same instant.
+CREATE INDEX IF NOT EXISTS users_created_at_idx ON users (created_at DESC, user_id DESC);
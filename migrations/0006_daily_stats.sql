@@ -0,0 +1,63 @@
+-- Per-day rollups for the admin statistics panel, so it reads one row per
+-- day instead of counting users and message_log.
+ALTER TABLE message_log ADD COLUMN IF NOT EXISTS content_type TEXT;
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day               DATE PRIMARY KEY,
+    new_users         INTEGER NOT NULL DEFAULT 0,
+    messages          INTEGER NOT NULL DEFAULT 0,
+    text_messages     INTEGER NOT NULL DEFAULT 0,
+    photo_messages    INTEGER NOT NULL DEFAULT 0,
+    video_messages    INTEGER NOT NULL DEFAULT 0,
+    voice_messages    INTEGER NOT NULL DEFAULT 0,
+    document_messages INTEGER NOT NULL DEFAULT 0,
+    other_messages    INTEGER NOT NULL DEFAULT 0,
+    -- distinct senders that day / first message of the month / first message ever;
+    -- the last two add up to monthly and all-time active senders
+    active_senders    INTEGER NOT NULL DEFAULT 0,
+    new_month_senders INTEGER NOT NULL DEFAULT 0,
+    new_senders       INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS sender_activity (
+    user_id  BIGINT PRIMARY KEY,
+    last_day DATE NOT NULL
+);
+
+-- Backfill from what is already there
+INSERT INTO daily_stats (day, new_users)
+SELECT created_at::date, COUNT(*)
+FROM users
+WHERE created_at IS NOT NULL
+GROUP BY 1
+ON CONFLICT (day) DO UPDATE SET new_users = EXCLUDED.new_users;
+
+WITH activity AS (
+    SELECT sender_id, sent_at::date AS day, COUNT(*) AS messages
+    FROM message_log
+    WHERE sender_id IS NOT NULL
+    GROUP BY 1, 2
+), ranked AS (
+    SELECT *,
+           day = MIN(day) OVER (PARTITION BY sender_id) AS first_ever,
+           day = MIN(day) OVER (PARTITION BY sender_id, date_trunc('month', day)) AS first_in_month
+    FROM activity
+)
+INSERT INTO daily_stats (day, messages, text_messages, active_senders, new_month_senders, new_senders)
+SELECT day, SUM(messages), SUM(messages), COUNT(*),
+       COUNT(*) FILTER (WHERE first_in_month), COUNT(*) FILTER (WHERE first_ever)
+FROM ranked
+GROUP BY day
+ON CONFLICT (day) DO UPDATE SET
+    messages          = EXCLUDED.messages,
+    text_messages     = EXCLUDED.text_messages,
+    active_senders    = EXCLUDED.active_senders,
+    new_month_senders = EXCLUDED.new_month_senders,
+    new_senders       = EXCLUDED.new_senders;
+
+INSERT INTO sender_activity (user_id, last_day)
+SELECT sender_id, MAX(sent_at)::date
+FROM message_log
+WHERE sender_id IS NOT NULL
+GROUP BY sender_id
+ON CONFLICT (user_id) DO NOTHING;
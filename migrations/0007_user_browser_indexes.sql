@@ -0,0 +1,3 @@
+-- The admin user browser walks users by (created_at, user_id); admins get
+-- their own small index so that filter does not scan everyone.
+CREATE INDEX IF NOT EXISTS users_admins_created_at_idx ON users (created_at DESC, user_id DESC) WHERE is_admin;
@@ -0,0 +1,10 @@
+-- Conversation state for aiogram's FSM. UNLOGGED skips the WAL: the table
+-- survives clean restarts and deploys, and is emptied only after a crash.
+CREATE UNLOGGED TABLE IF NOT EXISTS fsm_storage (
+    key        TEXT PRIMARY KEY,
+    state      TEXT,
+    data       JSONB NOT NULL DEFAULT '{}',
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS fsm_storage_expires_at_idx ON fsm_storage (expires_at);
@@ -0,0 +1,6 @@
+-- Flood-control strikes; each strike doubles the next automatic mute
+CREATE TABLE IF NOT EXISTS flood_strikes (
+    user_id        BIGINT PRIMARY KEY,
+    strikes        INTEGER NOT NULL DEFAULT 0,
+    last_strike_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,6 @@
+-- Log-channel mirror items that did not fit into the in-memory queue
+CREATE TABLE IF NOT EXISTS mirror_spill (
+    id         BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    payload    JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,8 @@
+-- Old links stay valid for a grace period after a user regenerates theirs
+CREATE TABLE IF NOT EXISTS token_aliases (
+    token      TEXT PRIMARY KEY,
+    user_id    BIGINT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS token_aliases_expires_at_idx ON token_aliases (expires_at);
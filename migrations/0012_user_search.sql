@@ -0,0 +1,9 @@
+-- Admin search matches usernames and names by substring. The trigram GIN
+-- indexes serve ILIKE '%x%' from three characters up; shorter input only
+-- matches prefixes, which the lower(...) text_pattern_ops indexes serve.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS users_username_trgm_idx ON users USING gin (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_name_trgm_idx ON users USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_username_prefix_idx ON users (lower(username) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS users_name_prefix_idx ON users (lower(name) text_pattern_ops);
@@ -0,0 +1,21 @@
+-- Anonymous conversations: one row per (sender, receiver) pair, where the
+-- sender is the side that first wrote through the receiver's link
+CREATE TABLE IF NOT EXISTS conversations (
+    id          BIGSERIAL PRIMARY KEY,
+    sender_id   BIGINT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    receiver_id BIGINT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+    created_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (sender_id, receiver_id)
+);
+
+-- Every copy the bot delivered, so a native reply to it finds its conversation
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    chat_id         BIGINT NOT NULL,
+    message_id      BIGINT NOT NULL,
+    conversation_id BIGINT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    created_at      TIMESTAMP NOT NULL,
+    PRIMARY KEY (chat_id, message_id)
+);
+
+CREATE INDEX IF NOT EXISTS conversation_messages_created_at_idx ON conversation_messages (created_at);
+CREATE INDEX IF NOT EXISTS conversation_messages_conversation_idx ON conversation_messages (conversation_id);
@@ -0,0 +1,24 @@
+-- Anonymous messages waiting for delivery. The handler inserts a row and
+-- acknowledges the sender; outbox workers send it, retrying transient
+-- Telegram errors with backoff. status: pending -> sending -> sent | dead
+CREATE TABLE IF NOT EXISTS outbox (
+    id              BIGSERIAL PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    sender_id       BIGINT NOT NULL,
+    target_id       BIGINT NOT NULL,
+    conversation_id BIGINT NOT NULL,
+    parts           JSONB NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL,
+    locked_by       TEXT,
+    locked_at       TIMESTAMP,
+    last_error      TEXT,
+    created_at      TIMESTAMP NOT NULL,
+    sent_at         TIMESTAMP
+);
+
+-- Due rows, and rows whose worker died mid-send
+CREATE INDEX IF NOT EXISTS outbox_due_idx ON outbox (next_attempt_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS outbox_stale_idx ON outbox (locked_at) WHERE status = 'sending';
+CREATE INDEX IF NOT EXISTS outbox_finished_idx ON outbox (created_at) WHERE status IN ('sent', 'dead');
@@ -0,0 +1,3 @@
+-- The admin browser's mute filter walks active mutes by (muted_until,
+-- user_id) instead of scanning every user for a mute row.
+CREATE INDEX IF NOT EXISTS muted_users_until_idx ON muted_users (muted_until DESC, user_id DESC);
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import CopyMessage, CopyMessages, SendMessage
+
+from outbound import LANE
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 5
+DIGEST_LIMIT = 4096  # Telegram message length limit
+# Raw text in a line is cut to this before it is HTML-escaped, which leaves
+# room for the header; cutting after escaping could split a tag or entity
+LINE_TEXT_LIMIT = DIGEST_LIMIT - 512
+SPILL_BATCH = 200
+
+
+# 🪞 LOG_CHANNEL'ga fon rejimida nusxa ko‘chirish
+class ChannelMirror:
+    # Items are ["media", from_chat_id, message_id, caption],
+    # ["album", from_chat_id, message_ids, caption] or ["text", line].
+    # Media is copied one by one, an album in one call followed by its
+    # caption; text lines are coalesced into digests.
+    # Items that do not fit into the queue, or are still queued at shutdown,
+    # are spilled to mirror_spill and fed back in once there is room.
+    def __init__(self, bot: Bot, pool, channel_id, rate: float = 0.3, burst: float = 3.0,
+                 max_queue: int = 1000, digest_lines: int = 30, digest_interval: float = 15.0):
+        self.bot = bot
+        self.pool = pool
+        self.channel_id = channel_id
+        self.bucket = TokenBucket(rate, capacity=burst, min_rate=min(rate, 0.05))
+        self.digest_lines = digest_lines
+        self.digest_interval = digest_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._overflow: list = []
+        self._spill_pending = True  # Rows may be left over from the previous run
+        self._digest: list[str] = []
+        self._task: asyncio.Task | None = None
+        self.sent = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.channel_id)
+
+    def submit_media(self, from_chat_id: int, message_id: int, caption: str):
+        self._submit(["media", from_chat_id, message_id, caption])
+
+    def submit_album(self, from_chat_id: int, message_ids: list[int], caption: str):
+        self._submit(["album", from_chat_id, message_ids, caption])
+
+    def submit_text(self, line: str):
+        self._submit(["text", line])
+
+    def _submit(self, item: list):
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self._overflow.append(item)
+
+    def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Whatever is left goes to the database and is sent after the restart
+        while not self._queue.empty():
+            self._overflow.append(self._queue.get_nowait())
+        self._overflow.extend(["text", line] for line in self._digest)
+        self._digest = []
+        try:
+            await self._spill()
+        except Exception:
+            logger.exception(f"Could not spill {len(self._overflow)} log channel items at shutdown")
+
+    async def _run(self):
+        LANE.set("mirror")
+        loop = asyncio.get_running_loop()
+        digest_started = loop.time()
+        while True:
+            try:
+                await self._spill()
+                await self._refill()
+
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=self.digest_interval)
+                except asyncio.TimeoutError:
+                    item = None
+
+                if item is not None and item[0] == "text":
+                    if not self._digest:
+                        digest_started = loop.time()
+                    self._digest.append(item[1])
+                elif item is not None and item[0] == "album":
+                    await self._send_album(*item[1:])
+                elif item is not None:
+                    await self._send_media(*item[1:])
+
+                if self._digest and (
+                    len(self._digest) >= self.digest_lines
+                    or loop.time() - digest_started >= self.digest_interval
+                ):
+                    await self._send_digest()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Log channel mirror failed")
+                await asyncio.sleep(1)
+
+    async def _send_media(self, from_chat_id: int, message_id: int, caption: str):
+        await self._call(CopyMessage(
+            chat_id=self.channel_id,
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            caption=caption,
+            parse_mode=ParseMode.HTML
+        ))
+
+    async def _send_album(self, from_chat_id: int, message_ids: list[int], caption: str):
+        # copyMessages keeps the grouping but cannot set a caption
+        await self._call(CopyMessages(chat_id=self.channel_id, from_chat_id=from_chat_id, message_ids=message_ids))
+        await self._call(SendMessage(chat_id=self.channel_id, text=caption, parse_mode=ParseMode.HTML))
+
+    async def _send_digest(self):
+        lines, self._digest = self._digest, []
+        chunk = ""
+        for line in lines:
+            if chunk and len(chunk) + len(line) + 2 > DIGEST_LIMIT:
+                await self._call(SendMessage(chat_id=self.channel_id, text=chunk, parse_mode=ParseMode.HTML))
+                chunk = ""
+            chunk = f"{chunk}\n\n{line}" if chunk else line
+        if chunk:
+            await self._call(SendMessage(chat_id=self.channel_id, text=chunk, parse_mode=ParseMode.HTML))
+
+    async def _call(self, method):
+        for _ in range(MAX_RETRIES):
+            await self.bucket.acquire()
+            try:
+                await self.bot(method)
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                self.bucket.penalize(e.retry_after)
+            except TelegramAPIError as e:
+                logger.warning(f"Mirror to log channel failed: {e}")
+                break
+        self.dropped += 1
+
+    # 💾 Navbatga sig‘magan elementlarni bazaga yozish va qaytarib olish
+    async def _spill(self):
+        if not self._overflow:
+            return
+        items, self._overflow = self._overflow, []
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute(
+                    "INSERT INTO mirror_spill (payload) SELECT * FROM unnest($1::jsonb[])",
+                    [json.dumps(item) for item in items]
+                )
+        except Exception:
+            # Keep them, in order, for the next attempt
+            self._overflow = items + self._overflow
+            raise
+        self.spilled += len(items)
+        self._spill_pending = True
+
+    async def _refill(self):
+        room = self._queue.maxsize - self._queue.qsize()
+        if not self._spill_pending or room < self._queue.maxsize // 2:
+            return
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("""
+                DELETE FROM mirror_spill
+                WHERE id IN (
+                    SELECT id FROM mirror_spill ORDER BY id LIMIT $1 FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, payload
+            """, min(room, SPILL_BATCH))
+        self._spill_pending = len(rows) == min(room, SPILL_BATCH)
+        # The rows are gone from the table now, and new items may have
+        # taken the room while the query ran; those that no longer fit wait
+        # in the overflow for the next spill
+        for row in sorted(rows, key=lambda row: row["id"]):
+            item = json.loads(row["payload"])
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._overflow.append(item)
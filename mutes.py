@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+
+def muted_text(muted_until: datetime) -> str:
+    return (
+        f"⛔ Siz vaqtinchalik xabar yubora olmaysiz.\n"
+        f"🕒 Mute Toshkent vaqti bilan {muted_until:%Y-%m-%d %H:%M:%S} gacha davom etadi.\n"
+        f"Iltimos, kuting."
+    )
+
+
+# 🔇 Xotiradagi mute reyestri: user_id -> muted_until va muddat bo‘yicha heap
+class MuteRegistry:
+    # Mute checks never touch the database. The sweeper expires entries off
+    # the heap and deletes their rows in one statement. A periodic reload
+    # picks up mutes and unmutes made by other workers or replicas.
+    # Flood mutes are written to muted_users in batches by the sweeper; an
+    # unmute drops a mute that is still waiting for its batch and deletes
+    # the row under the same lock, so a batch in flight cannot bring it back.
+    def __init__(self, sweep_interval: float = 30.0, reload_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self.reload_interval = reload_interval
+        self.pool = None
+        self._until: dict[int, datetime] = {}
+        self._heap: list[tuple[datetime, int]] = []
+        self._stale: set[int] = set()
+        self._pending: dict[int, tuple[datetime, str]] = {}  # user_id -> (muted_until, reason), not written yet
+        self._flushing: dict[int, tuple[datetime, str]] = {}
+        self._write_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+    async def load(self, pool):
+        self.pool = pool
+        await self.reload()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._write_pending()
+        await self._delete_stale()
+
+    async def reload(self):
+        now = self._now()
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT user_id, muted_until FROM muted_users WHERE muted_until > $1", now)
+        self._until = {row["user_id"]: row["muted_until"] for row in rows}
+        # Mutes whose rows are not written yet are not in the result
+        for user_id, (muted_until, _) in {**self._flushing, **self._pending}.items():
+            if muted_until > max(now, self._until.get(user_id, now)):
+                self._until[user_id] = muted_until
+        self._heap = [(muted_until, user_id) for user_id, muted_until in self._until.items()]
+        heapq.heapify(self._heap)
+
+    def muted_until(self, user_id: int) -> datetime | None:
+        muted_until = self._until.get(user_id)
+        if muted_until is not None and muted_until <= self._now():
+            del self._until[user_id]
+            self._stale.add(user_id)
+            return None
+        return muted_until
+
+    # With a reason the row is written by the sweeper; without one the
+    # caller has written it already
+    def mute(self, user_id: int, muted_until: datetime, reason: str | None = None):
+        self._until[user_id] = muted_until
+        self._stale.discard(user_id)
+        heapq.heappush(self._heap, (muted_until, user_id))
+        if reason is not None:
+            self._pending[user_id] = (muted_until, reason)
+
+    # Returns True if the user was muted
+    async def unmute(self, user_id: int) -> bool:
+        was_muted = self._until.pop(user_id, None) is not None
+        self._pending.pop(user_id, None)
+        self._flushing.pop(user_id, None)
+        async with self._write_lock:
+            result = await self.pool.status("unmute_user", user_id)
+        return was_muted or result != "DELETE 0"
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_reload = loop.time() + self.reload_interval
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self._expire()
+                await self._write_pending()
+                await self._delete_stale()
+                if loop.time() >= next_reload:
+                    next_reload = loop.time() + self.reload_interval
+                    await self.reload()
+            except Exception:
+                logger.exception("Mute registry sweep failed")
+
+    def _expire(self):
+        now = self._now()
+        while self._heap and self._heap[0][0] <= now:
+            muted_until, user_id = heapq.heappop(self._heap)
+            # Entries superseded by a later mute/unmute are simply dropped
+            if self._until.get(user_id) == muted_until:
+                del self._until[user_id]
+                self._stale.add(user_id)
+
+    async def _write_pending(self):
+        if not self._pending or self.pool is None:
+            return
+        async with self._write_lock:
+            self._flushing, self._pending = self._pending, {}
+            try:
+                async with self.pool.acquire() as conn:
+                    # muted_users references users, so senders that never
+                    # registered stay muted in memory only
+                    await conn.execute("""
+                        INSERT INTO muted_users (user_id, muted_until, reason)
+                        SELECT f.user_id, f.muted_until, f.reason
+                        FROM unnest($1::bigint[], $2::timestamp[], $3::text[]) AS f(user_id, muted_until, reason)
+                        JOIN users u ON u.user_id = f.user_id
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET muted_until = GREATEST(muted_users.muted_until, EXCLUDED.muted_until),
+                            reason      = EXCLUDED.reason,
+                            created_at  = CURRENT_TIMESTAMP
+                    """, list(self._flushing), [value[0] for value in self._flushing.values()],
+                        [value[1] for value in self._flushing.values()])
+            except Exception:
+                # Keep the batch for the next sweep; newer mutes win
+                self._pending = {**self._flushing, **self._pending}
+                raise
+            finally:
+                self._flushing = {}
+
+    async def _delete_stale(self):
+        if not self._stale or self.pool is None:
+            return
+        stale, self._stale = self._stale, set()
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM muted_users WHERE user_id = ANY($1::bigint[]) AND muted_until <= $2",
+                list(stale), self._now()
+            )
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+
+
+mute_registry = MuteRegistry()
@@ -0,0 +1,209 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from metrics import Histogram
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first. The weights are each lane's share of the global
+# rate while every lane has something waiting; an idle lane's share goes
+# to the others.
+LANES = ("interactive", "admin", "mirror", "bulk")
+LANE_WEIGHTS = {"interactive": 8, "admin": 4, "mirror": 2, "bulk": 1}
+GROUP_CHAT_RATE = 20 / 60  # Telegram: about 20 messages a minute in a group or channel
+CHAT_BURST = 3  # Sends a quiet chat may take at once before its rate applies
+MAX_TRACKED_CHATS = 10_000
+# Only calls that put something in a chat count against Telegram's limits
+SCHEDULED_PREFIXES = ("send", "copy", "forward", "edit")
+UNSCHEDULED = frozenset({"sendChatAction"})
+
+LANE = contextvars.ContextVar("outbound_lane", default="interactive")
+OUTBOUND_WAIT = Histogram("bot_outbound_wait_seconds", "Time Bot API sends waited for their turn", ("lane",))
+
+
+# Tasks created inside inherit the lane, so a whole worker can be put in
+# one with a single LANE.set() at its start
+@contextmanager
+def use_lane(name: str):
+    token = LANE.set(name)
+    try:
+        yield
+    finally:
+        LANE.reset(token)
+
+
+# 🛣 Router darajasida yo‘lak tanlash (masalan, admin panel)
+class LaneMiddleware(BaseMiddleware):
+    def __init__(self, name: str):
+        self.name = name
+
+    async def __call__(self, handler, event, data):
+        with use_lane(self.name):
+            return await handler(event, data)
+
+
+class _Lane:
+    def __init__(self, name: str, weight: int):
+        self.name = name
+        self.weight = weight
+        self.chats: OrderedDict = OrderedDict()  # chat_id -> deque of waiting futures
+        self.depth = 0
+        self.pass_ = 0.0
+
+
+# 🚥 Chiquvchi Bot API so‘rovlari navbati
+class OutboundScheduler(BaseRequestMiddleware):
+    # Every send, copy, forward and edit waits here for a turn. A turn
+    # needs a token from the global bucket and room in the target chat's
+    # own budget: chat_rate a second for private chats, GROUP_CHAT_RATE for
+    # groups and channels, CHAT_BURST at once. Lanes are picked by stride
+    # scheduling on their weights. Within a lane, chats take turns, so one
+    # busy chat cannot hold up the rest. Calls to one chat in one lane keep
+    # their order. Other methods (getUpdates, answerCallbackQuery, ...) go
+    # straight through, as does everything before start() and after stop().
+    def __init__(self, rate: float = 30.0, chat_rate: float = 1.0):
+        self.bucket = TokenBucket(rate)
+        self.chat_rate = chat_rate
+        self._lanes = {name: _Lane(name, LANE_WEIGHTS[name]) for name in LANES}
+        self._chats: dict = {}  # chat_id -> theoretical arrival time of its next send
+        self._virtual = 0.0
+        self._arrived = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def depth(self, lane: str) -> int:
+        return self._lanes[lane].depth
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Whoever is still waiting goes through unscheduled
+        for lane in self._lanes.values():
+            for waiters in lane.chats.values():
+                for future in waiters:
+                    if not future.done():
+                        future.set_result(None)
+            lane.chats.clear()
+            lane.depth = 0
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        if self._task is None or name in UNSCHEDULED or not name.startswith(SCHEDULED_PREFIXES):
+            return await make_request(bot, method)
+
+        lane = self._lanes[LANE.get()]
+        chat_id = getattr(method, "chat_id", None)
+        started = time.monotonic()
+        await self._admit(lane, chat_id)
+        OUTBOUND_WAIT.observe(lane.name, value=time.monotonic() - started)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            # The global rate stays under Telegram's limit, so a flood wait
+            # is about this chat; the other chats keep going
+            self._hold(chat_id, e.retry_after)
+            raise
+
+    async def _admit(self, lane: _Lane, chat_id):
+        future = asyncio.get_running_loop().create_future()
+        if not lane.depth:
+            # A lane does not bank credit for the time it had nothing to send
+            lane.pass_ = max(lane.pass_, self._virtual)
+        lane.chats.setdefault(chat_id, deque()).append(future)
+        lane.depth += 1
+        self._arrived.set()
+        await future
+
+    async def _run(self):
+        while True:
+            try:
+                delay = self._ready_in(time.monotonic())
+                if delay is not None and delay <= 0:
+                    await self.bucket.acquire()
+                    # Picked after the token, so whatever arrived meanwhile
+                    # competes on priority too
+                    self._grant(time.monotonic())
+                    continue
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbound scheduler failed")
+                await asyncio.sleep(1)
+
+    # Seconds until some waiting call may go out; None if nothing waits
+    def _ready_in(self, now: float) -> float | None:
+        soonest = None
+        for lane in self._lanes.values():
+            for chat_id in lane.chats:
+                wait = self._chat_wait(chat_id, now)
+                if wait <= 0:
+                    return 0.0
+                soonest = wait if soonest is None else min(soonest, wait)
+        return soonest
+
+    def _grant(self, now: float):
+        lanes = sorted((lane for lane in self._lanes.values() if lane.chats), key=lambda lane: lane.pass_)
+        for lane in lanes:
+            for chat_id in list(lane.chats):
+                if self._chat_wait(chat_id, now) > 0:
+                    continue
+                waiters = lane.chats.pop(chat_id)
+                future = waiters.popleft()
+                lane.depth -= 1
+                if waiters:
+                    lane.chats[chat_id] = waiters  # To the back of the round
+                if future.done():
+                    continue  # The caller gave up waiting
+                self._virtual = lane.pass_
+                lane.pass_ += 1 / lane.weight
+                self._charge(chat_id, now)
+                future.set_result(None)
+                return
+
+    # 💬 Har bir chat uchun alohida limit (GCRA)
+    def _interval(self, chat_id) -> float:
+        if isinstance(chat_id, int) and chat_id > 0:
+            return 1 / self.chat_rate
+        return 1 / GROUP_CHAT_RATE
+
+    def _chat_wait(self, chat_id, now: float) -> float:
+        tat = self._chats.get(chat_id)
+        if tat is None:
+            return 0.0
+        return tat - now - (CHAT_BURST - 1) * self._interval(chat_id)
+
+    def _charge(self, chat_id, now: float):
+        if chat_id is None:
+            return  # Inline messages have no chat to count against
+        self._chats[chat_id] = max(self._chats.get(chat_id, now), now) + self._interval(chat_id)
+        if len(self._chats) > MAX_TRACKED_CHATS:
+            # Chats whose budget is full again need no entry
+            self._chats = {chat: tat for chat, tat in self._chats.items() if tat > now}
+
+    def _hold(self, chat_id, seconds: float):
+        if chat_id is None:
+            return
+        now = time.monotonic()
+        held = now + seconds + (CHAT_BURST - 1) * self._interval(chat_id)
+        self._chats[chat_id] = max(self._chats.get(chat_id, now), held)
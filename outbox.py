@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+from aiogram.types import Message
+
+from keyboards import conversation_keyboard
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 120  # A worker that died mid-send gives its rows back after this
+POLL_INTERVAL = 1.0  # Other replicas' rows and due retries are picked up at least this often
+CLAIM_SIZE = 4  # Rows a worker takes at a time; a slow send holds up at most the others in its claim
+BASE_BACKOFF = 2.0
+MAX_BACKOFF = 600.0
+TRANSIENT_ERRORS = (TelegramServerError, TelegramNetworkError, asyncio.TimeoutError)
+
+OUTBOX_RESULTS = Counter("bot_outbox_attempts_total", "Outbox delivery attempts by outcome", ("result",))
+
+
+def _now() -> datetime:
+    return datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+
+
+# 📮 Anonim xabarlar navbati: handler yozadi, workerlar yetkazadi
+class DeliveryOutbox:
+    # The handler only inserts a row and acknowledges the sender. Each
+    # worker loop claims a few due rows under a lease, sends them through
+    # the relay one by one and records every outcome as soon as it is
+    # known. on_sent and on_dead run only if the row was still under this
+    # worker's lease when it was recorded, so a row another worker took
+    # over is not counted twice. 429s, Telegram 5xx and network errors are
+    # retried with exponential backoff; a blocked chat, a rejected message
+    # or max_attempts failures move the row to 'dead'. The idempotency key
+    # (the sender's chat and first message id) turns a redelivered update
+    # into a no-op. A worker that dies between sending and recording
+    # leaves its rows to be sent again once the lease runs out, so
+    # delivery is at least once.
+    def __init__(self, pool, relay, on_sent, on_dead, workers: int = 8, max_attempts: int = 8,
+                 retention_hours: float = 72.0, sweep_interval: float = 3600.0):
+        self.pool = pool
+        self.relay = relay
+        self.on_sent = on_sent  # async (row, parts, sent_ids)
+        self.on_dead = on_dead  # async (row, parts, error)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retention = timedelta(hours=retention_hours)
+        self.sweep_interval = sweep_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.in_flight = 0
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._tasks: list[asyncio.Task] = []
+        self._sweeper: asyncio.Task | None = None
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+        if self._tasks:
+            # Rows that are being sent are finished and recorded first, so
+            # a restart does not send them twice
+            self._closing = True
+            self._wakeup.set()
+            await asyncio.gather(*self._tasks)
+
+    # Returns False if this message was already queued
+    async def enqueue(self, parts: list[Message], target_id: int, conversation_id: int) -> bool:
+        first = parts[0]
+        payload = json.dumps([part.model_dump(mode="json", exclude_none=True) for part in parts])
+        queued = await self.pool.val(
+            "enqueue_outbox", f"{first.chat.id}:{first.message_id}", first.from_user.id, target_id,
+            conversation_id, payload, _now()
+        )
+        self._wakeup.set()
+        return queued is not None
+
+    async def _work(self):
+        while not self._closing:
+            rows = None
+            try:
+                rows = await self.pool.rows("claim_outbox", self.worker_id, _now(), LEASE_SECONDS, CLAIM_SIZE)
+                self.in_flight += len(rows)
+                for row in rows:
+                    try:
+                        await self._deliver(row)
+                    finally:
+                        self.in_flight -= 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox worker failed")
+
+            # A full claim means more may be due right away
+            if not self._closing and (not rows or len(rows) < CLAIM_SIZE):
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _sweep(self):
+        while True:
+            try:
+                await self.pool.status("expire_outbox", _now() - self.retention)
+            except Exception:
+                logger.exception("Failed to expire outbox rows")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def _deliver(self, row):
+        parts = [Message.model_validate(part) for part in json.loads(row["parts"])]
+        error, delay, permanent = None, None, False
+        try:
+            sent_ids = await self.relay.send(parts, row["target_id"], conversation_keyboard(row["conversation_id"]))
+        except TelegramRetryAfter as e:
+            error, delay = e, e.retry_after
+        except TRANSIENT_ERRORS as e:
+            error = e
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            error, permanent = e, True
+        except Exception as e:
+            logger.exception(f"Unexpected error delivering outbox row {row['id']}")
+            error = e
+
+        if error is None:
+            status, next_attempt_at = "sent", None
+        elif permanent or row["attempts"] >= self.max_attempts:
+            status, next_attempt_at = "dead", None
+        else:
+            if delay is None:
+                delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (row["attempts"] - 1)) * random.uniform(0.8, 1.2)
+            status, next_attempt_at = "pending", _now() + timedelta(seconds=delay)
+        OUTBOX_RESULTS.inc("retried" if status == "pending" else status)
+
+        if not await self._finish(row, status, next_attempt_at, error and type(error).__name__):
+            logger.warning(f"Outbox row {row['id']} was taken over by another worker; its outcome is dropped")
+            return
+
+        if status == "sent":
+            try:
+                await self.on_sent(row, parts, sent_ids)
+            except Exception:
+                logger.exception(f"Outbox row {row['id']} was sent but its bookkeeping failed")
+        elif status == "dead":
+            logger.warning(f"Outbox row {row['id']} dead after {row['attempts']} attempts: {error!r}")
+            try:
+                await self.on_dead(row, parts, error)
+            except Exception:
+                logger.exception(f"Failed to report dead outbox row {row['id']}")
+
+    # False if the lease ran out and another worker holds the row now
+    async def _finish(self, row, status: str, next_attempt_at: datetime | None, error: str | None) -> bool:
+        result = await self.pool.status(
+            "finish_outbox", [row["id"]], [status], [next_attempt_at], [error], _now(), self.worker_id
+        )
+        return result != "UPDATE 0"
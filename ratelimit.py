@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+# Telegram recovers from a flood wait gradually; ramping back to the full
+# rate over a minute avoids bouncing straight into the next RetryAfter.
+RECOVERY_DELAY = 10.0
+RECOVERY_PERIOD = 60.0
+
+
+# 🪣 Token bucket: global tezlik cheklovi
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None, min_rate: float = 1.0):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._penalized_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._updated)
+        if self.rate < self.max_rate and now - self._penalized_at > RECOVERY_DELAY:
+            self.rate = min(self.max_rate, self.rate + elapsed * self.max_rate / RECOVERY_PERIOD)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def penalize(self, retry_after: float):
+        # Telegram told us to back off: pause the bucket, drop the burst
+        # allowance and halve the rate until it recovers
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + retry_after)
+        self._penalized_at = now
+        self._tokens = 0.0
+        self._updated = self._blocked_until
+        self.rate = max(self.min_rate, self.rate / 2)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.enums import ContentType
+from aiogram.types import (
+    InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo, Message,
+)
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+HEADER = "<b>📨 Sizga yangi anonim xabar bor!</b>"
+TEXT_LIMIT = 4096
+CAPTION_LIMIT = 1024
+
+# copy_message can replace the caption of these, so the header goes inline
+CAPTIONED = {
+    ContentType.PHOTO, ContentType.VIDEO, ContentType.ANIMATION,
+    ContentType.AUDIO, ContentType.DOCUMENT, ContentType.VOICE,
+}
+# These have no caption: the header is sent as a message of its own
+PLAIN = {
+    ContentType.STICKER, ContentType.VIDEO_NOTE, ContentType.LOCATION,
+    ContentType.VENUE, ContentType.CONTACT, ContentType.DICE,
+}
+SUPPORTED = {ContentType.TEXT} | CAPTIONED | PLAIN
+
+
+class _Album:
+    def __init__(self, route, now: float):
+        self.route = route
+        self.parts: list[Message] = []
+        self.started = now
+        self.touched = now
+
+
+# 📦 Har qanday xabarni qabul qiluvchiga anonim ko‘chirish
+class MediaRelay:
+    # An album reaches the bot as one update per item. The first item to
+    # arrive owns the album: it waits until no new item has come for
+    # album_window seconds (album_max_wait at most) and gets the whole
+    # group back to send. The other items only join the buffer. Items that
+    # turn up after the album has been collected are sent on their own.
+    # With several webhook workers an album can be split between processes;
+    # each part then goes out as its own (smaller) album.
+    def __init__(self, bot: Bot, album_window: float = 0.8, album_max_wait: float = 3.0):
+        self.bot = bot
+        self.album_window = album_window
+        self.album_max_wait = album_max_wait
+        self._albums: dict[str, _Album] = {}
+        self._sent_albums = TTLCache("sent_albums", maxsize=10_000, ttl=60.0)  # media_group_id -> route
+
+    @property
+    def open_albums(self) -> int:
+        return len(self._albums)
+
+    @staticmethod
+    def supports(message: Message) -> bool:
+        return message.content_type in SUPPORTED
+
+    def is_late_part(self, media_group_id: str | None) -> bool:
+        return media_group_id is not None and self._sent_albums.get(media_group_id, None) is not None
+
+    # A part that will only join an album another update is collecting
+    def joins_album(self, media_group_id: str | None) -> bool:
+        return media_group_id is not None and media_group_id in self._albums
+
+    # Returns the parts that are ready to send: the message itself, every
+    # part of an album for the update that owns it, or nothing for a part
+    # that joined an album still being collected. route is whatever the
+    # caller needs to send late parts the same way (see late_route).
+    async def collect(self, message: Message, route) -> list[Message]:
+        if message.media_group_id is None:
+            return [message]
+
+        album = self._albums.get(message.media_group_id)
+        if album is not None:
+            album.parts.append(message)
+            album.touched = asyncio.get_running_loop().time()
+            return []
+        return await self._collect(message, route)
+
+    def late_route(self, media_group_id: str):
+        return self._sent_albums.get(media_group_id, None)
+
+    # Returns the ids of the copies in the target chat, header included
+    async def send(self, parts: list[Message], target_id: int, keyboard) -> list[int]:
+        if len(parts) == 1:
+            return await self._send_single(parts[0], target_id, keyboard)
+        return await self._send_album(parts, target_id, keyboard)
+
+    async def _collect(self, message: Message, route) -> list[Message]:
+        loop = asyncio.get_running_loop()
+        album = self._albums[message.media_group_id] = _Album(route, loop.time())
+        album.parts.append(message)
+        try:
+            while True:
+                now = loop.time()
+                wait = min(album.touched + self.album_window, album.started + self.album_max_wait) - now
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            del self._albums[message.media_group_id]
+        self._sent_albums.set(message.media_group_id, route)
+        return sorted(album.parts, key=lambda part: part.message_id)
+
+    async def _send_single(self, message: Message, target_id: int, keyboard) -> list[int]:
+        content_type = message.content_type
+        if content_type == ContentType.TEXT:
+            text = f"{HEADER}\n\n{message.html_text}"
+            if len(text) <= TEXT_LIMIT:
+                sent = await self.bot.send_message(target_id, text, reply_markup=keyboard)
+                return [sent.message_id]
+        elif content_type in CAPTIONED:
+            caption = f"{HEADER}\n\n{message.html_text}" if message.caption else HEADER
+            if len(caption) <= CAPTION_LIMIT:
+                sent = await self.bot.copy_message(
+                    target_id, message.chat.id, message.message_id, caption=caption, reply_markup=keyboard
+                )
+                return [sent.message_id]
+
+        # No room for the header inside the message itself
+        header = await self.bot.send_message(target_id, HEADER)
+        sent = await self.bot.copy_message(target_id, message.chat.id, message.message_id, reply_markup=keyboard)
+        return [header.message_id, sent.message_id]
+
+    async def _send_album(self, parts: list[Message], target_id: int, keyboard) -> list[int]:
+        # A media group cannot carry a keyboard, so the header brings it
+        header = await self.bot.send_message(target_id, HEADER, reply_markup=keyboard)
+        sent = await self.bot.send_media_group(target_id, [_input_media(part) for part in parts])
+        return [header.message_id, *(message.message_id for message in sent)]
+
+
+def _input_media(message: Message):
+    caption = message.html_text if message.caption else None
+    if message.photo:
+        return InputMediaPhoto(media=message.photo[-1].file_id, caption=caption,
+                               has_spoiler=message.has_media_spoiler)
+    if message.video:
+        return InputMediaVideo(media=message.video.file_id, caption=caption,
+                               has_spoiler=message.has_media_spoiler)
+    if message.audio:
+        return InputMediaAudio(media=message.audio.file_id, caption=caption)
+    return InputMediaDocument(media=message.document.file_id, caption=caption)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+CONTENT_COLUMNS = {
+    "text": "text_messages",
+    "photo": "photo_messages",
+    "video": "video_messages",
+    "voice": "voice_messages",
+    "document": "document_messages",
+}
+COUNTER_COLUMNS = (
+    "new_users", "messages", "text_messages", "photo_messages", "video_messages", "voice_messages",
+    "document_messages", "other_messages", "active_senders", "new_month_senders", "new_senders",
+)
+
+
+# 📊 daily_stats uchun xotirada yig‘iladigan hisoblagichlar
+class StatsAggregator:
+    def __init__(self, pool, flush_interval: float = 10.0):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self._counters: dict[date, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._senders: dict[int, set[date]] = defaultdict(set)
+        self._task: asyncio.Task | None = None
+
+    def user_created(self, day: date):
+        self._counters[day]["new_users"] += 1
+
+    def message_logged(self, sender_id: int, content_type: str | None, day: date):
+        counters = self._counters[day]
+        counters["messages"] += 1
+        counters[CONTENT_COLUMNS.get(content_type, "other_messages")] += 1
+        self._senders[sender_id].add(day)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush daily stats")
+
+    async def flush(self):
+        if not self._counters:
+            return
+        counters, self._counters = self._counters, defaultdict(lambda: defaultdict(int))
+        senders, self._senders = self._senders, defaultdict(set)
+        try:
+            await self._write(counters, senders)
+        except Exception:
+            # Put the deltas back for the next flush rather than losing them
+            self._restore(counters, senders)
+            raise
+
+    def _restore(self, counters, senders):
+        for day, day_counters in counters.items():
+            for column, value in day_counters.items():
+                self._counters[day][column] += value
+        for sender_id, days in senders.items():
+            self._senders[sender_id] |= days
+
+    async def _write(self, counters, senders):
+        # Sender counts are added to a copy, so a rolled back transaction
+        # leaves nothing in the batch that the next flush would count again
+        counters = defaultdict(lambda: defaultdict(int), {
+            day: defaultdict(int, day_counters) for day, day_counters in counters.items()
+        })
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if senders:
+                    await self._count_active_senders(conn, counters, senders)
+
+                days = sorted(counters)
+                columns = ", ".join(COUNTER_COLUMNS)
+                await conn.execute(f"""
+                    INSERT INTO daily_stats (day, {columns})
+                    SELECT * FROM unnest($1::date[], {", ".join(
+                        f"${i}::int[]" for i in range(2, len(COUNTER_COLUMNS) + 2)
+                    )})
+                    ON CONFLICT (day) DO UPDATE SET {", ".join(
+                        f"{column} = daily_stats.{column} + EXCLUDED.{column}" for column in COUNTER_COLUMNS
+                    )}
+                """, days, *[[counters[day].get(column, 0) for day in days] for column in COUNTER_COLUMNS])
+
+    # Distinct senders cannot be summed across days, so each sender's last
+    # active day decides whether today, this month or ever is new for them
+    @staticmethod
+    async def _count_active_senders(conn, counters, senders):
+        user_ids = sorted(senders)
+        rows = await conn.fetch("""
+            SELECT user_id, last_day FROM sender_activity
+            WHERE user_id = ANY($1::bigint[])
+            ORDER BY user_id
+            FOR UPDATE
+        """, user_ids)
+        last_days = {row["user_id"]: row["last_day"] for row in rows}
+
+        for user_id in user_ids:
+            last_day = last_days.get(user_id)
+            for day in sorted(senders[user_id]):
+                if last_day is not None and day <= last_day:
+                    continue
+                counters[day]["active_senders"] += 1
+                if last_day is None:
+                    counters[day]["new_senders"] += 1
+                if last_day is None or (last_day.year, last_day.month) != (day.year, day.month):
+                    counters[day]["new_month_senders"] += 1
+                last_day = day
+            last_days[user_id] = last_day
+
+        await conn.execute("""
+            INSERT INTO sender_activity (user_id, last_day)
+            SELECT * FROM unnest($1::bigint[], $2::date[])
+            ON CONFLICT (user_id) DO UPDATE
+            SET last_day = GREATEST(sender_activity.last_day, EXCLUDED.last_day)
+        """, user_ids, [last_days[user_id] for user_id in user_ids])
+
+
+# 📈 Admin panel uchun: bugun, shu oy va jami
+async def fetch_summary(pool, today: date) -> dict:
+    month_start = today.replace(day=1)
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(f"""
+            SELECT
+                {", ".join(f"COALESCE(SUM({c}) FILTER (WHERE day = $1), 0) AS today_{c}" for c in COUNTER_COLUMNS)},
+                {", ".join(f"COALESCE(SUM({c}) FILTER (WHERE day >= $2), 0) AS month_{c}" for c in COUNTER_COLUMNS)},
+                {", ".join(f"COALESCE(SUM({c}), 0) AS total_{c}" for c in COUNTER_COLUMNS)}
+            FROM daily_stats
+        """, today, month_start)
+    return dict(row)
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from cache import TTLCache
+from mutes import mute_registry, muted_text
+
+logger = logging.getLogger(__name__)
+
+STRIKE_MEMORY = timedelta(hours=24)  # Strikes older than this are forgotten
+MAX_MUTE = timedelta(hours=24)
+RECEIVER_BUSY = "⏳ Qabul qiluvchiga hozir juda ko‘p xabar kelmoqda. Birozdan so‘ng urinib ko‘ring."
+NEWLINK_BUSY = "⏳ Havolani juda tez-tez yangilayapsiz. Birozdan so‘ng urinib ko‘ring."
+
+
+# 🪟 Sirpanuvchi oyna hisoblagichi
+class SlidingWindow:
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._hits: dict[int, deque] = {}
+
+    def hit(self, key: int, now: float) -> bool:
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = self._hits[key] = deque()
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            return False
+        hits.append(now)
+        return True
+
+    def reset(self, key: int):
+        self._hits.pop(key, None)
+
+    def prune(self, now: float):
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+
+
+# 🛡 Flood nazorati: yuboruvchi va qabul qiluvchi bo‘yicha limitlar
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, question_state: str, sender_limit: int = 20, sender_window: float = 60.0,
+                 receiver_limit: int = 60, receiver_window: float = 60.0, mute_minutes: int = 10,
+                 newlink_limit: int = 3, newlink_window: float = 3600.0, sync_interval: float = 30.0):
+        self.question_state = question_state
+        self.senders = SlidingWindow(sender_limit, sender_window)
+        self.receivers = SlidingWindow(receiver_limit, receiver_window)
+        self.newlinks = SlidingWindow(newlink_limit, newlink_window)
+        self.mute_minutes = mute_minutes
+        self.sync_interval = sync_interval
+        self.pool = None
+        self.throttled = 0
+        self._strikes: dict[int, tuple[int, datetime]] = {}
+        self._dirty_strikes: set[int] = set()
+        self._forgiven: set[int] = set()  # Strike rows to delete after an admin unmute
+        self._albums = TTLCache("flood_albums", maxsize=10_000, ttl=60.0)  # media_group_id -> True
+        self._task: asyncio.Task | None = None
+
+    async def attach(self, pool):
+        self.pool = pool
+        since = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None) - STRIKE_MEMORY
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT user_id, strikes, last_strike_at FROM flood_strikes WHERE last_strike_at > $1", since
+            )
+        self._strikes = {row["user_id"]: (row["strikes"], row["last_strike_at"]) for row in rows}
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.sync()
+
+    async def __call__(self, handler, event: Message, data):
+        if event.from_user is None:
+            return await handler(event, data)
+
+        user_id = event.from_user.id
+        now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+
+        # Only the anonymous-message path is limited; admin flows and plain
+        # commands are cheap and not worth counting, and stay open to muted users
+        is_link = event.text is not None and event.text.startswith("/start ")
+        is_question = data.get("raw_state") == self.question_state
+        # A native reply to a message from the bot may be a threaded reply;
+        # its receiver is only known in the handler (see allow_receiver)
+        reply = event.reply_to_message
+        is_reply = reply is not None and reply.from_user is not None and reply.from_user.id == data["bot"].id
+        if not is_link and not is_question and not is_reply:
+            return await handler(event, data)
+
+        # An album arrives as one update per item but counts as one message
+        album_seen = False
+        if event.media_group_id is not None:
+            album_seen = bool(self._albums.get(event.media_group_id, None))
+            self._albums.set(event.media_group_id, True)
+
+        muted_until = mute_registry.muted_until(user_id)
+        if muted_until is not None:
+            if not album_seen:
+                await event.answer(muted_text(muted_until))
+            return None
+        if album_seen:
+            return await handler(event, data)
+
+        if not self.senders.hit(user_id, time.monotonic()):
+            await self._mute(event, user_id, now)
+            return None
+
+        if is_question:
+            target_id = (await data["state"].get_data()).get("target_id")
+            if target_id is not None and not self.allow_receiver(target_id):
+                await event.answer(RECEIVER_BUSY)
+                return None
+
+        return await handler(event, data)
+
+    # After an admin unmute the user starts with an empty window, and the
+    # next flood gets the shortest mute again
+    def forgive(self, user_id: int):
+        self.senders.reset(user_id)
+        self._strikes.pop(user_id, None)
+        self._dirty_strikes.discard(user_id)
+        self._forgiven.add(user_id)
+
+    def allow_receiver(self, target_id: int) -> bool:
+        if self.receivers.hit(target_id, time.monotonic()):
+            return True
+        self.throttled += 1
+        return False
+
+    # Every /newlink writes a token and leaves an alias behind for the grace
+    # period, so it has its own limit; going over it is not a strike
+    def allow_newlink(self, user_id: int) -> bool:
+        if self.newlinks.hit(user_id, time.monotonic()):
+            return True
+        self.throttled += 1
+        return False
+
+    async def _mute(self, event: Message, user_id: int, now: datetime):
+        self.throttled += 1
+        strikes, last_strike_at = self._strikes.get(user_id, (0, now))
+        if now - last_strike_at > STRIKE_MEMORY:
+            strikes = 0
+        muted_until = now + min(MAX_MUTE, timedelta(minutes=self.mute_minutes * 2 ** strikes))
+
+        self._strikes[user_id] = (strikes + 1, now)
+        self._dirty_strikes.add(user_id)
+        # is_user_muted sees the mute right away; the row follows with the registry's next sweep
+        mute_registry.mute(user_id, muted_until, reason="Flood")
+        logger.info(f"Flood: muted {user_id} until {muted_until:%Y-%m-%d %H:%M} (strike {strikes + 1})")
+
+        await event.answer(
+            f"⛔ Juda ko‘p xabar yubordingiz.\n"
+            f"🕒 Siz Toshkent vaqti bilan {muted_until:%Y-%m-%d %H:%M:%S} gacha xabar yubora olmaysiz."
+        )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Failed to sync flood-control state")
+            clock = time.monotonic()
+            self.senders.prune(clock)
+            self.receivers.prune(clock)
+            self.newlinks.prune(clock)
+            now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+            self._strikes = {
+                k: v for k, v in self._strikes.items() if now - v[1] <= STRIKE_MEMORY or k in self._dirty_strikes
+            }
+
+    # 🔄 Xotiradagi strike'larni bazaga yozish
+    async def sync(self):
+        if self.pool is None or (not self._dirty_strikes and not self._forgiven):
+            return
+        dirty, self._dirty_strikes = self._dirty_strikes, set()
+        forgiven, self._forgiven = self._forgiven, set()
+        strikes = {user_id: self._strikes[user_id] for user_id in dirty if user_id in self._strikes}
+
+        try:
+            await self._write(strikes, forgiven)
+        except Exception:
+            # Keep them for the next sync rather than losing the strikes
+            self._dirty_strikes |= dirty
+            self._forgiven |= forgiven
+            raise
+
+    async def _write(self, strikes: dict, forgiven: set[int]):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # A user struck again after the unmute gets the fresh row below
+                if forgiven:
+                    await conn.execute(
+                        "DELETE FROM flood_strikes WHERE user_id = ANY($1::bigint[])", list(forgiven)
+                    )
+                if strikes:
+                    await conn.execute("""
+                        INSERT INTO flood_strikes (user_id, strikes, last_strike_at)
+                        SELECT * FROM unnest($1::bigint[], $2::int[], $3::timestamp[])
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET strikes = EXCLUDED.strikes, last_strike_at = EXCLUDED.last_strike_at
+                    """, list(strikes), [value[0] for value in strikes.values()],
+                        [value[1] for value in strikes.values()])
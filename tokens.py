@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import secrets
+import string
+from collections import deque
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from asyncpg.exceptions import UniqueViolationError
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.ascii_letters + string.digits
+MAX_ATTEMPTS = 5
+
+
+def new_token(length: int = 10) -> str:
+    return "".join(secrets.choice(ALPHABET) for _ in range(length))
+
+
+# 🔑 Havola tokenlari: oldindan tayyorlangan zaxira va almashtirish
+class TokenService:
+    # Tokens are minted in batches in the background and checked against
+    # users and token_aliases in one query, so registration just pops one.
+    # A collision that slips through (another replica minted the same
+    # token) is caught on the unique index and retried with a fresh token.
+    def __init__(self, pool, length: int = 10, batch_size: int = 500, low_water: int = 100,
+                 grace: timedelta = timedelta(hours=24), sweep_interval: float = 600.0):
+        self.pool = pool
+        self.length = length
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.grace = grace
+        self.sweep_interval = sweep_interval
+        self._tokens: deque[str] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.collisions = 0
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def take(self) -> str:
+        if len(self._tokens) <= self.low_water:
+            self._wakeup.set()
+        if self._tokens:
+            return self._tokens.popleft()
+        return new_token(self.length)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time()
+        while True:
+            try:
+                if len(self._tokens) <= self.low_water:
+                    await self.mint()
+                if loop.time() >= next_sweep:
+                    next_sweep = loop.time() + self.sweep_interval
+                    await self.expire_aliases()
+            except Exception:
+                logger.exception("Token service failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.sweep_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def mint(self):
+        candidates = list({new_token(self.length) for _ in range(self.batch_size)})
+        async with self.pool.acquire() as conn:
+            free = await conn.fetch("""
+                SELECT t.token FROM unnest($1::text[]) AS t(token)
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.token = t.token)
+                  AND NOT EXISTS (SELECT 1 FROM token_aliases a WHERE a.token = t.token)
+            """, candidates)
+        self._tokens.extend(row["token"] for row in free)
+
+    # 🔄 Havolani almashtirish: eski token grace davomida ishlayveradi
+    async def rotate(self, user_id: int) -> tuple[str, str] | None:
+        expires_at = self._now() + self.grace
+        for _ in range(MAX_ATTEMPTS):
+            try:
+                row = await self.pool.row("rotate_token", user_id, self.take(), expires_at)
+            except UniqueViolationError as e:
+                if e.constraint_name != "users_token_key":
+                    raise
+                self.collisions += 1
+                continue
+            if row is None:
+                return None
+            if row["new_token"] is None:
+                self.collisions += 1  # Still an alias of some old link
+                continue
+            return row["old_token"], row["new_token"]
+        raise RuntimeError(f"Could not find a free token for {user_id} in {MAX_ATTEMPTS} attempts")
+
+    async def expire_aliases(self):
+        await self.pool.status("expire_token_aliases", self._now())
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
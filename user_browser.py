@@ -0,0 +1,181 @@
+import hashlib
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from cache import MISSING, count_cache, search_cache
+
+EPOCH = datetime(1970, 1, 1)
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+SEARCH_LIMIT = 50  # Ranked matches kept per search; paging walks this list
+MIN_TRIGRAM_LENGTH = 3  # Shorter queries have no trigrams to look up, so they match prefixes
+
+FILTERS = {
+    "a": "Hammasi",
+    "A": "Adminlar",
+    "m": "Mute",
+    "d1": "Bugun",
+    "d7": "7 kun",
+    "d30": "30 kun",
+}
+
+
+# 🔢 Kursorni callback_data ichiga sig‘adigan qilib kodlash
+def _base36(value: int) -> str:
+    digits = ""
+    while True:
+        value, rest = divmod(value, 36)
+        digits = DIGITS[rest] + digits
+        if not value:
+            return digits
+
+
+def encode_cursor(created_at: datetime, user_id: int) -> str:
+    micros = (created_at - EPOCH) // timedelta(microseconds=1)
+    return f"{_base36(micros)}.{_base36(user_id)}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    micros, user_id = cursor.split(".")
+    return EPOCH + timedelta(microseconds=int(micros, 36)), int(user_id, 36)
+
+
+# Cursors come back in callback_data, which the client can forge
+def valid_cursor(cursor: str) -> bool:
+    try:
+        _, user_id = decode_cursor(cursor)
+    except (ValueError, OverflowError):
+        return False
+    return user_id < 2 ** 63
+
+
+def _filter_since(code: str, now: datetime) -> datetime | None:
+    if not code.startswith("d"):
+        return None
+    days = int(code[1:])
+    return (now - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Appends a query argument and returns its $n placeholder
+def _binder(params: list):
+    def bind(value):
+        params.append(value)
+        return f"${len(params)}"
+    return bind
+
+
+# Returns (FROM clause, sort column, user_id column, conditions)
+def _filter_source(code: str, now: datetime, bind) -> tuple[str, str, str, list[str]]:
+    conditions = ["u.created_at IS NOT NULL"]
+    if code == "m":
+        # Few users are muted, so the mute filter walks muted_users by its
+        # own index and joins the users in
+        conditions.append(f"m.muted_until > {bind(now)}")
+        return "muted_users m JOIN users u ON u.user_id = m.user_id", "m.muted_until", "m.user_id", conditions
+    if code == "A":
+        conditions.append("u.is_admin")
+    elif code.startswith("d"):
+        conditions.append(f"u.created_at >= {bind(_filter_since(code, now))}")
+    return "users u", "u.created_at", "u.user_id", conditions
+
+
+# 📄 Bitta sahifa: "n" — eskiroqlar (keyingi), "p" — yangiroqlar (oldingi)
+# Every filter only narrows the walk over an index on (sort_at DESC,
+# user_id DESC): created_at for users, muted_until for the mute filter. A
+# page costs the same however deep it is; the cursor is the last sort_at.
+async def fetch_page(pool, code: str, direction: str, cursor: str | None, limit: int):
+    now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+    params = []
+    bind = _binder(params)
+    source, sort_column, key, conditions = _filter_source(code, now, bind)
+
+    order = "DESC"
+    if cursor is not None:
+        sort_at, user_id = decode_cursor(cursor)
+        operator = "<"
+        if direction == "p":
+            operator, order = ">", "ASC"
+        conditions.append(f"({sort_column}, {key}) {operator} ({bind(sort_at)}, {bind(user_id)})")
+
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(f"""
+            SELECT u.user_id, u.name, u.created_at, {sort_column} AS sort_at
+            FROM {source}
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {sort_column} {order}, {key} {order}
+            LIMIT {bind(limit + 1)}
+        """, *params)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if order == "ASC":
+        rows.reverse()
+    return rows, has_more
+
+
+# 🧮 Umumiy son: aniq COUNT(*) o‘rniga taxminiy yoki keshlangan qiymat
+async def count_users(pool, code: str) -> tuple[int, bool]:
+    if code == "m":
+        # Exactly the rows the mute filter lists; a short index range
+        now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+        params = []
+        source, _, _, conditions = _filter_source(code, now, _binder(params))
+        async with pool.acquire() as conn:
+            count = await conn.fetchval(f"SELECT COUNT(*) FROM {source} WHERE {' AND '.join(conditions)}", *params)
+        return count, False
+    cached = count_cache.get(code)
+    if cached is not MISSING:
+        return cached
+
+    now = datetime.now(ZoneInfo("Asia/Tashkent")).replace(tzinfo=None)
+    async with pool.acquire() as conn:
+        if code == "a":
+            # Planner estimate, kept fresh by autovacuum/ANALYZE
+            result = (await conn.fetchval(
+                "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'users'::regclass"
+            ), True)
+        elif code.startswith("d"):
+            result = (await conn.fetchval(
+                "SELECT COALESCE(SUM(new_users), 0) FROM daily_stats WHERE day >= $1",
+                _filter_since(code, now).date()
+            ), False)
+        else:
+            result = (await conn.fetchval("SELECT COUNT(*) FROM users WHERE is_admin"), False)
+
+    count_cache.set(code, result)
+    return result
+
+
+# 🔍 Username yoki ism bo‘yicha qidiruv
+def normalize_query(text: str) -> str:
+    return " ".join(text.strip().lstrip("@").split()).lower()
+
+
+# The key goes into callback_data, which is capped at 64 bytes
+def search_key(query: str) -> str:
+    return hashlib.blake2b(query.encode(), digest_size=6).hexdigest()
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Returns (matches, truncated); results are cached by query so paging and
+# repeated searches do not hit the database again
+async def search_users(pool, query: str) -> tuple[list, bool]:
+    cached = search_cache.get(search_key(query))
+    if cached is not MISSING:
+        return cached[1], cached[2]
+
+    if len(query) < MIN_TRIGRAM_LENGTH:
+        rows = await pool.rows("search_users_prefix", f"{_escape_like(query)}%", query, SEARCH_LIMIT + 1)
+    else:
+        rows = await pool.rows("search_users_trigram", f"%{_escape_like(query)}%", query, SEARCH_LIMIT + 1)
+    matches = [dict(row) for row in rows[:SEARCH_LIMIT]]
+    truncated = len(rows) > SEARCH_LIMIT
+    search_cache.set(search_key(query), (query, matches, truncated))
+    return matches, truncated
+
+
+def cached_search(key: str) -> tuple[str, list, bool] | None:
+    cached = search_cache.get(key)
+    return None if cached is MISSING else cached
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from asyncpg.exceptions import UniqueViolationError
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+
+# 👤 Ro‘yxatdan o‘tkazish: bitta upsert, kerak bo‘lsa bir nechta foydalanuvchi birga
+class UserRegistrar:
+    # register_users (db.QUERIES) inserts new users, refreshes username and
+    # name only when they differ, and returns every user's token in the
+    # same round trip. With batch_window > 0, registrations arriving within
+    # the window share one multi-row statement.
+    def __init__(self, pool, tokens, batch_window: float = 0.0, max_batch: int = 200):
+        self.pool = pool
+        self.tokens = tokens
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._pending: dict[int, list] = {}  # user_id -> [username, name, created_at, future]
+        self._full = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self.batches = 0
+        self.registered = 0
+
+    # Returns (token, created)
+    async def register(self, user_id: int, username: str | None, name: str,
+                       created_at: datetime) -> tuple[str, bool]:
+        if self.batch_window <= 0:
+            return (await self._upsert({user_id: [username, name, created_at, None]}))[user_id]
+
+        entry = self._pending.get(user_id)
+        if entry is None:
+            entry = self._pending[user_id] = [username, name, created_at, asyncio.get_running_loop().create_future()]
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        elif len(self._pending) >= self.max_batch:
+            self._full.set()
+        # The future is shared by every caller in the batch
+        return await asyncio.shield(entry[3])
+
+    async def close(self):
+        if self._flusher is not None:
+            self._full.set()
+            await self._flusher
+
+    async def _flush_later(self):
+        try:
+            await asyncio.wait_for(self._full.wait(), timeout=self.batch_window)
+        except asyncio.TimeoutError:
+            pass
+        batch, self._pending = self._pending, {}
+        self._flusher = None
+        self._full.clear()
+
+        try:
+            results = await self._upsert(batch)
+        except Exception as e:
+            for entry in batch.values():
+                entry[3].set_exception(e)
+            return
+        for user_id, entry in batch.items():
+            entry[3].set_result(results[user_id])
+
+    async def _upsert(self, batch: dict[int, list]) -> dict[int, tuple[str, bool]]:
+        results = {}
+        remaining = sorted(batch)  # A fixed order keeps concurrent batches from deadlocking
+        for _ in range(MAX_ATTEMPTS):
+            try:
+                rows = await self.pool.rows(
+                    "register_users",
+                    remaining,
+                    [batch[user_id][0] for user_id in remaining],
+                    [batch[user_id][1] for user_id in remaining],
+                    [self.tokens.take() for _ in remaining],
+                    [batch[user_id][2] for user_id in remaining],
+                )
+            except UniqueViolationError as e:
+                if e.constraint_name != "users_token_key":
+                    raise
+                self.tokens.collisions += 1
+                continue
+
+            self.batches += 1
+            for row in rows:
+                results[row["user_id"]] = (row["token"], row["created"])
+                self.registered += row["created"]
+            # A user inserted by another transaction after this statement's
+            # snapshot is neither inserted nor visible; the next pass sees it
+            remaining = [user_id for user_id in remaining if user_id not in results]
+            if not remaining:
+                return results
+        raise RuntimeError(f"Could not register users {remaining} in {MAX_ATTEMPTS} attempts")
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+
+# 🚦 Bir vaqtda ishlanayotgan update'lar sonini cheklash
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+
+    async def __call__(self, handler, event, data):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await handler(event, data)
+            finally:
+                self.in_flight -= 1
+
+
+def build_app(dp: Dispatcher, bot: Bot, path: str, secret: str | None) -> web.Application:
+    app = web.Application()
+    # Telegram gets its 200 once the update is handled. It keeps at most
+    # max_connections requests open and retries what fails, so a slow bot
+    # slows Telegram down instead of piling up tasks in memory
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret, handle_in_background=False).register(
+        app, path=path
+    )
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+# 🌐 Webhook rejimi
+async def run_webhook(dp: Dispatcher, bot: Bot, *, url: str, path: str, secret: str | None,
+                      host: str, port: int, worker_index: int = 0, max_connections: int = 100):
+    app = build_app(dp, bot, path, secret)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    # SO_REUSEPORT lets every worker process bind the same port; the kernel
+    # spreads incoming connections between them
+    site = web.TCPSite(runner, host=host, port=port, reuse_port=True)
+    await site.start()
+
+    # Only one worker registers the webhook, the rest just serve it
+    if worker_index == 0:
+        await bot.set_webhook(
+            url=url.rstrip("/") + path,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=max_connections,
+        )
+        logger.info(f"Webhook set to {url.rstrip('/') + path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info(f"Worker {worker_index} serving webhook on {host}:{port}{path}")
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()